@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""Synthetic-project benchmark for the SCons Swift tool.
+
+Generates a tree of N Swift modules with M files each, where every module
+imports K earlier modules (optionally also a C++ header module through
+C++ interop), and measures with utils/fake_swiftc.py in place of swiftc,
+so no Swift toolchain is needed:
+
+- SConscript parse time, node count and peak memory of the SCons process
+- full build and null build wall time
+- optionally, with --profile, the time spent in the tool's emitters,
+  scanners and construction-variable substitution
+
+Results are written as JSON for regression tracking:
+
+    python benchmarks/swift_bench.py --modules 50 --files 20 --imports 3 \\
+        --output bench.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import pstats
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TOOLPATH = os.path.join(REPO, "sconscontrib", "SCons", "Tool")
+
+# Compiler stand-in writing the requested outputs without compiling
+FAKE_SWIFTC = os.path.join(REPO, "utils", "fake_swiftc.py")
+
+SCONSTRUCT = '''
+import atexit, gc, json, os, resource, time
+_start = time.perf_counter()
+
+import SCons.Node
+
+env = Environment(tools=["default", "swift"], toolpath=[{toolpath!r}], SWIFT={swift!r})
+env["ENV"].update({fake_env!r})
+if {interop!r}:
+    env["SWIFT_CXX_INTEROP"] = True
+    env["SWIFT_EMIT_CXX_HEADER"] = True
+    env.Append(SWIFTPATH=["#cxx"])
+
+modules = []
+for i in range({modules}):
+    name = f"Mod{{i}}"
+    deps = [modules[d] for d in range(max(0, i - {imports}), i)]
+    modules.append(
+        env.SwiftModule(
+            f"{{name}}/{{name}}",
+            Glob(f"{{name}}/*.swift"),
+            SWIFTMODULENAME=name,
+            SWIFTMODULES=deps,
+        )
+    )
+env.SwiftProgram("app", ["main.swift"], SWIFTMODULES=modules)
+
+_parsed = time.perf_counter()
+
+def _write_stats():
+    stats = {{
+        "parse_time": _parsed - _start,
+        "node_count": sum(
+            1 for o in gc.get_objects() if isinstance(o, SCons.Node.Node)
+        ),
+        "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }}
+    with open(ARGUMENTS["bench_stats"], "w") as f:
+        json.dump(stats, f)
+
+if "bench_stats" in ARGUMENTS:
+    atexit.register(_write_stats)
+'''
+
+
+def generate_tree(root, args):
+    """Write the synthetic project below root"""
+    for i in range(args.modules):
+        name = f"Mod{i}"
+        os.makedirs(os.path.join(root, name), exist_ok=True)
+        imports = [f"Mod{d}" for d in range(max(0, i - args.imports), i)]
+        if args.interop:
+            imports.append("CxxShim")
+        for j in range(args.files):
+            with open(os.path.join(root, name, f"File{j}.swift"), "w") as f:
+                for imported in imports:
+                    f.write(f"import {imported}\n")
+                f.write(f"\npublic func {name.lower()}_f{j}(_ x: Int) -> Int {{\n")
+                f.write(f"    return x + {j}\n}}\n")
+
+    with open(os.path.join(root, "main.swift"), "w") as f:
+        f.write(f"import Mod{args.modules - 1}\n\nprint(0)\n")
+
+    if args.interop:
+        os.makedirs(os.path.join(root, "cxx"), exist_ok=True)
+        with open(os.path.join(root, "cxx", "shim.h"), "w") as f:
+            f.write("#pragma once\ninline int shim(int x) { return x; }\n")
+        with open(os.path.join(root, "cxx", "module.modulemap"), "w") as f:
+            f.write('module CxxShim {\n    header "shim.h"\n    export *\n}\n')
+
+    with open(os.path.join(root, "SConstruct"), "w") as f:
+        f.write(
+            SCONSTRUCT.format(
+                toolpath=TOOLPATH,
+                swift=FAKE_SWIFTC,
+                fake_env={
+                    "FAKE_SWIFTC_STARTUP": str(args.startup),
+                    "FAKE_SWIFTC_LATENCY": str(args.latency),
+                    "FAKE_SWIFTC_MEMORY_MB": str(args.memory_mb),
+                },
+                interop=args.interop,
+                modules=args.modules,
+                imports=args.imports,
+            )
+        )
+
+
+def run_scons(args, root, *options):
+    """Run SCons in root and return its wall time and process statistics"""
+    stats_file = os.path.join(root, "bench-stats.json")
+    cmd = args.scons + ["-Q", f"-j{args.jobs}", f"bench_stats={stats_file}"]
+    start = time.perf_counter()
+    subprocess.run(cmd + list(options), cwd=root, check=True, stdout=subprocess.DEVNULL)
+    wall = time.perf_counter() - start
+    with open(stats_file) as f:
+        stats = json.load(f)
+    stats["wall_time"] = wall
+    return stats
+
+
+def summarize(runs):
+    """Reduce repeated runs to the median of each measurement"""
+    summary = {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+    summary["runs"] = len(runs)
+    return summary
+
+
+def profile_tool(args, root):
+    """Profile a null build and return the cumulative time per tool function"""
+    profile = os.path.join(root, "bench.prof")
+    run_scons(args, root, f"--profile={profile}")
+    stats = pstats.Stats(profile)
+    functions = {}
+    for (filename, _, name), (_, _, _, cumulative, _) in stats.stats.items():
+        if filename.endswith(os.path.join("swift", "swift.py")):
+            key = f"swift.{name}"
+        elif filename.endswith(os.path.join("SCons", "Subst.py")) and name in (
+            "scons_subst",
+            "scons_subst_list",
+        ):
+            key = f"Subst.{name}"
+        else:
+            continue
+        functions[key] = functions.get(key, 0.0) + cumulative
+    ranked = sorted(functions.items(), key=lambda item: -item[1])
+    return dict(ranked[: args.profile_top])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modules", type=int, default=20, help="number of modules")
+    parser.add_argument("--files", type=int, default=10, help="files per module")
+    parser.add_argument(
+        "--imports", type=int, default=2, help="earlier modules imported by each module"
+    )
+    parser.add_argument(
+        "--interop", action="store_true", help="import a C++ header module too"
+    )
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1)
+    parser.add_argument(
+        "--startup", type=float, default=0.0, help="fake compiler seconds per process"
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="fake compiler seconds per source"
+    )
+    parser.add_argument(
+        "--memory-mb", type=float, default=0.0, help="fake compiler memory per process"
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement")
+    parser.add_argument("--profile", action="store_true", help="profile the tool")
+    parser.add_argument("--profile-top", type=int, default=25)
+    parser.add_argument("--output", help="write the JSON results to this file")
+    parser.add_argument("--keep", help="generate the tree here and keep it")
+    parser.add_argument(
+        "--scons",
+        help="command running SCons (default: scons, or python -m SCons)",
+    )
+    args = parser.parse_args()
+    if args.scons:
+        args.scons = args.scons.split()
+    elif shutil.which("scons"):
+        args.scons = [shutil.which("scons")]
+    else:
+        args.scons = [sys.executable, "-m", "SCons"]
+
+    root = args.keep or tempfile.mkdtemp(prefix="swift-bench-")
+    os.makedirs(root, exist_ok=True)
+    try:
+        generate_tree(root, args)
+
+        full = []
+        for _ in range(args.repeat):
+            subprocess.run(
+                args.scons + ["-Q", "-c"], cwd=root, check=True, stdout=subprocess.DEVNULL
+            )
+            full.append(run_scons(args, root))
+        null = [run_scons(args, root) for _ in range(args.repeat)]
+
+        results = {
+            "config": {
+                "modules": args.modules,
+                "files": args.files,
+                "imports": args.imports,
+                "interop": args.interop,
+                "jobs": args.jobs,
+                "startup": args.startup,
+                "latency": args.latency,
+                "memory_mb": args.memory_mb,
+            },
+            "python": platform.python_version(),
+            "full_build": summarize(full),
+            "null_build": summarize(null),
+        }
+        if args.profile:
+            results["profile"] = profile_tool(args, root)
+    finally:
+        if not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
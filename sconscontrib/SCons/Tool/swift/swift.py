@@ -34,10 +34,22 @@ selection method.
 # WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 #
 
+import atexit
+import json
 import os
+import re
+import sys
+import threading
+import time
 import SCons.Action
 import SCons.Builder
 import SCons.Defaults
+import SCons.Errors
+import SCons.Node.FS
+import SCons.Node.Python
+import SCons.Scanner
+import SCons.SConsign
+import SCons.Subst
 import SCons.Tool
 import SCons.Util
 
@@ -47,44 +59,1723 @@ SwiftSuffixes = [".swift"]
 # Swift compiler to use
 compilers = ["swiftc"]
 
-def _swift_cxx_header_emitter(target, source, env):
-    # Swift generates additional files alongside object files
-    base = SCons.Util.splitext(str(target[0]))[0]
+# Optimization modes accepted in SWIFT_OPTIMIZATION
+SwiftOptimizationFlags = {
+    "none": "-Onone",
+    "speed": "-O",
+    "size": "-Osize",
+    "unchecked": "-Ounchecked",
+}
+
+# swiftc driver options that swift-frontend rejects, with their argument count
+SwiftDriverOnlyFlags = {
+    "-enable-batch-mode": 0,
+    "-disable-batch-mode": 0,
+    "-driver-batch-count": 1,
+    "-driver-batch-size-limit": 1,
+    "-incremental": 0,
+    "-j": 1,
+    "-save-temps": 0,
+    "-v": 0,
+}
+
+# Files written next to a .swiftmodule: suffix variable and swiftc flag
+SwiftModuleOutputs = {
+    "swiftdoc": ("$SWIFTDOCSUFFIX", "-emit-module-doc-path"),
+    "swiftsourceinfo": ("$SWIFTSOURCEINFOSUFFIX", "-emit-module-source-info-path"),
+    "abi.json": ("$SWIFTABISUFFIX", "-emit-abi-descriptor-path"),
+    "swiftinterface": ("$SWIFTINTERFACESUFFIX", "-emit-module-interface-path"),
+}
+
+# Matches `import X`, `@_implementationOnly import X`, `internal import X`,
+# `@testable import X`, `import struct X.Y` and similar declarations.
+SwiftImportRE = re.compile(
+    r"^[ \t]*(?:@\w+(?:\([^)\n]*\))?[ \t]+)*"
+    r"(?:(?:public|package|internal|fileprivate|private)[ \t]+)?"
+    r"import[ \t]+"
+    r"(?:(?:typealias|struct|class|enum|protocol|let|var|func)[ \t]+)?"
+    r"([A-Za-z_]\w*)",
+    re.M,
+)
+
+# Module declarations and header directives in a module.modulemap
+ModuleMapDeclRE = re.compile(r"\bmodule\s+([\w.]+)[^{;]*\{")
+ModuleMapHeaderRE = re.compile(
+    r"^\s*(?:(?:umbrella|private|textual)\s+)*header\s+\"([^\"]+)\"", re.M
+)
+
+
+def _sconsign_dir(env):
+    """Return the directory holding the .sconsign database."""
+    name = getattr(SCons.SConsign, "DB_Name", None) or ".sconsign"
+    return os.path.dirname(env.Dir("#").File(name).get_abspath())
+
+
+class _SideCache:
+    """A JSON dictionary persisted next to the .sconsign database.
+
+    The file is read on first use and written back once at exit, and only
+    if an entry was changed.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.path = None
+        self.data = None
+        self.dirty = False
+
+    def _load(self, env):
+        name = getattr(SCons.SConsign, "DB_Name", None) or ".sconsign"
+        self.path = os.path.join(
+            _sconsign_dir(env), f"{os.path.basename(name)}.swift_{self.name}.json"
+        )
+        try:
+            with open(self.path) as f:
+                self.data = json.load(f)
+        except (OSError, ValueError):
+            self.data = {}
+        atexit.register(self.save)
+
+    def get(self, env, key, default=None):
+        if self.data is None:
+            self._load(env)
+        return self.data.get(key, default)
+
+    def set(self, env, key, value):
+        if self.data is None:
+            self._load(env)
+        if self.data.get(key) != value:
+            self.data[key] = value
+            self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump(self.data, f, sort_keys=True)
+            os.replace(tmp, self.path)
+        except OSError:
+            pass
+        self.dirty = False
+
+
+# Content signature and imports of each scanned source, keyed by path, so
+# an edited source replaces its entry instead of adding one
+_import_cache = _SideCache("imports")
+
+# Headers of each Clang module, keyed by modulemap signature and module name
+_modulemap_cache = {}
+
+
+def _swift_imports(node, env):
+    """Return the module names imported by a Swift source node"""
+    path = node.get_abspath()
+    csig = node.get_csig()
+    entry = _import_cache.get(env, path)
+    if entry and entry[0] == csig:
+        return entry[1]
+    imports = sorted(set(SwiftImportRE.findall(node.get_text_contents())))
+    _import_cache.set(env, path, [csig, imports])
+    return imports
+
+
+def _modulemap_headers(modulemap, name):
+    """Return the headers declared for module `name`, or None if the
+    modulemap does not declare it."""
+    key = (modulemap.get_csig(), name)
+    if key not in _modulemap_cache:
+        headers = None
+        contents = modulemap.get_text_contents()
+        for m in ModuleMapDeclRE.finditer(contents):
+            if m.group(1) != name:
+                continue
+            # Find the end of the module body, allowing nested submodules
+            depth, end = 1, m.end()
+            while depth and end < len(contents):
+                if contents[end] == "{":
+                    depth += 1
+                elif contents[end] == "}":
+                    depth -= 1
+                end += 1
+            headers = ModuleMapHeaderRE.findall(contents, m.end(), end)
+            break
+        _modulemap_cache[key] = headers
+
+    headers = _modulemap_cache[key]
+    if headers is None:
+        return None
+    nodes = [modulemap.dir.File(h) for h in headers]
+    return [n for n in nodes if n.rexists() or n.has_builder()]
 
+
+def _modulemap_modules(modulemap):
+    """Return the top-level module names declared in a modulemap"""
+    contents = modulemap.get_text_contents()
+    names = []
+    for m in ModuleMapDeclRE.finditer(contents):
+        prefix = contents[: m.start()]
+        if prefix.count("{") == prefix.count("}"):
+            names.append(m.group(1))
+    return names
+
+
+def _modulemap_scan(node, env, path):
+    """Return the headers of all modules declared in a modulemap"""
+    if not node.rexists():
+        return []
+    headers = []
+    for name in _modulemap_modules(node):
+        headers.extend(_modulemap_headers(node, name) or [])
+    return headers
+
+
+ModuleMapScanner = SCons.Scanner.ScannerBase(_modulemap_scan, name="ModuleMapScanner")
+
+# Module cache warm-up stamps created by SwiftModuleCache, keyed by modulemap path
+_module_cache_stamps = {}
+
+
+def _find_swift_import(name, env, path):
+    """Resolve an imported module name to the files that provide it"""
+    for candidate in (
+        name + env.subst("$SWIFTMODULESUFFIX"),
+        name + ".swiftinterface",
+        os.path.join(name + ".framework", name),
+    ):
+        node = SCons.Node.FS.find_file(candidate, path)
+        if node:
+            interface = _swift_interface_node(node, env)
+            if interface is not None:
+                return [node, interface]
+            return [node]
+
+    # Clang modules are declared in a module.modulemap on the search path
+    for d in path:
+        modulemap = SCons.Node.FS.find_file("module.modulemap", (d,))
+        if modulemap and modulemap.rexists():
+            headers = _modulemap_headers(modulemap, name)
+            if headers is not None:
+                stamp = _module_cache_stamps.get(modulemap.get_abspath())
+                return [modulemap] + headers + ([stamp] if stamp else [])
+
+    return []
+
+
+def _swift_interface_node(module, env):
+    """Return the public interface file emitted next to a .swiftmodule, if any"""
+    suffix = env.subst("$SWIFTMODULESUFFIX")
+    if not module.name.endswith(suffix):
+        return None
+    base = module.name[: -len(suffix)]
+    for interface_suffix in (
+        env.subst("$SWIFTINTERFACESUFFIX"),
+        env.subst("$SWIFTABISUFFIX"),
+    ):
+        node = module.dir.File(base + interface_suffix)
+        if node.rexists() or node.has_builder():
+            return node
+    return None
+
+
+def _swift_scan(node, env, path):
+    """Scan a Swift source for imported Swift and Clang modules"""
+    if not node.rexists():
+        return []
+
+    own_module = env.subst("$SWIFTMODULENAME")
+    deps = []
+    for name in _swift_imports(node, env):
+        if name != own_module:
+            deps.extend(_find_swift_import(name, env, path))
+    return deps
+
+
+def _swift_scan_path(env, dir, target=None, source=None):
+    """Return the module search path: SWIFTPATH, FRAMEWORKPATH and the
+    directories of the modules in SWIFTMODULES"""
+    return (
+        SCons.Scanner.FindPathDirs("SWIFTPATH")(env, dir, target, source)
+        + SCons.Scanner.FindPathDirs("FRAMEWORKPATH")(env, dir, target, source)
+        + tuple(SCons.Util.unique([m.dir for m in _swift_module_deps(env)[0]]))
+    )
+
+
+SwiftScanner = SCons.Scanner.ScannerBase(
+    _swift_scan,
+    name="SwiftScanner",
+    skeys=SwiftSuffixes,
+    path_function=_swift_scan_path,
+)
+
+def _swift_cxx_header_name(env, module):
+    """Return the file name of the C++ header generated for a module target"""
+    name = env.get("SWIFT_CXX_HEADER_NAME")
+    if name:
+        return name
+    return SCons.Util.splitext(str(module))[0] + "-Swift.h"
+
+def _swift_cxx_header_emitter(target, source, env):
     # When C++ interop is enabled, Swift generates additional files
     if env.get("SWIFT_CXX_INTEROP"):
-        # Add generated C++ header if requested (as side effect)
+        # Add generated C++ header if requested
         if env.get("SWIFT_EMIT_CXX_HEADER"):
-            header_name = env.get("SWIFT_CXX_HEADER_NAME", base + "-Swift.h")
-            header_path = os.path.dirname(target[0].relpath)
-            cxx_header = env.File(header_name)
-            env["_SWIFT_CXX_HEADER_NAME"] = cxx_header
+            cxx_header = env.File(_swift_cxx_header_name(env, target[0]))
+            # The header is only replaced when its content changes, so
+            # SCons must not remove it before rebuilding the module
+            env.Precious(cxx_header)
             target.append(cxx_header)
 
     return target, source
 
+def _swift_cxx_header_target(target, env):
+    """Return the generated C++ header among the targets, if any"""
+    name = os.path.basename(_swift_cxx_header_name(env, target[0]))
+    for t in target[1:]:
+        if t.name == name:
+            return t
+    return None
+
+def _swift_cxx_header_flags(target, source, env, for_signature):
+    """Emit the C++ header to a temporary path next to the real one"""
+    header = _swift_cxx_header_target(target, env)
+    if header is None:
+        return []
+    return ["-emit-clang-header-path", header.get_abspath() + ".tmp"]
+
+def _swift_update_cxx_header(target, source, env):
+    """Replace the C++ header only when the generated content differs.
+
+    An unchanged header keeps its timestamp and signature, so C++
+    translation units including it are not recompiled.
+    """
+    header = _swift_cxx_header_target(target, env)
+    if header is None:
+        return 0
+
+    path = header.get_abspath()
+    tmp = path + ".tmp"
+    try:
+        with open(tmp, "rb") as f:
+            contents = f.read()
+    except OSError:
+        return 0
+    try:
+        with open(path, "rb") as f:
+            unchanged = f.read() == contents
+    except OSError:
+        unchanged = False
+
+    if unchanged:
+        os.remove(tmp)
+    else:
+        os.replace(tmp, path)
+    return 0
+
 def _swift_emitter(target, source, env):
-    """Add swiftmodule, swiftdoc, and swiftsourceinfo files to targets when building object files"""
-    # Swift generates additional files alongside object files
+    """Add swiftdoc, swiftsourceinfo and abi.json files to targets when building a module"""
+    # Swift generates additional files alongside the module
     base = SCons.Util.splitext(str(target[0]))[0]
 
-    # Add module files if we're building a module (as side effects)
+    # These are real targets rather than side effects, so that CacheDir
+    # stores and restores them together with the module
     if env.get("SWIFTMODULENAME"):
-        swiftsourceinfo = env.File(base + ".swiftsourceinfo")
-        swiftdoc = env.File(base + ".swiftdoc")
-        abi = env.File(base + ".abi.json")
-        env.SideEffect([swiftsourceinfo, swiftdoc, abi], target)
+        for kind in env.get("SWIFT_MODULE_OUTPUTS", []):
+            if kind not in SwiftModuleOutputs:
+                raise SCons.Errors.UserError(
+                    f"Unknown Swift module output {kind!r} in SWIFT_MODULE_OUTPUTS"
+                )
+            target.append(env.File(base + env.subst(SwiftModuleOutputs[kind][0])))
 
     return target, source
 
+def _swift_module_output_flags(target, source, env, for_signature):
+    """Return the output path flags for the module files in SWIFT_MODULE_OUTPUTS"""
+    base = SCons.Util.splitext(target[0].get_abspath())[0]
+    flags = []
+    for kind in env.get("SWIFT_MODULE_OUTPUTS", []):
+        suffix, flag = SwiftModuleOutputs[kind]
+        flags.extend([flag, base + env.subst(suffix)])
+    return flags
+
+def _swift_object_node(target_dir, source):
+    """Return the object file swiftc writes for a source of a module"""
+    return target_dir.File(SCons.Util.splitext(source.name)[0] + ".o")
+
 def _swift_obj_emitter(target, source, env):
     for s in source:
-        name = SCons.Util.splitext(str(s))[0]
-        f = env.File(name + ".o")
-        target.append(f)
+        target.append(_swift_object_node(target[0].dir, s))
+
+    env.Clean(
+        target[0], env.subst("$SWIFT_OUTPUT_FILE_MAP", target=target, source=source)
+    )
+    return target, source
+
+def _swift_incremental_emitter(target, source, env):
+    """Keep objects and dependency records between runs in incremental mode"""
+    if env.get("SWIFT_INCREMENTAL"):
+        # swiftc reuses the previous objects, so SCons must not remove them
+        env.Precious(target)
+        records = [
+            env.File(SCons.Util.splitext(str(t))[0] + ".swiftdeps")
+            for t in target
+            if str(t).endswith(".o")
+        ]
+        master = env.File(
+            SCons.Util.splitext(str(target[0]))[0] + "-master.swiftdeps"
+        )
+        env.Clean(target[0], records + [master])
+
+    return target, source
+
+def _swift_dependencies_emitter(target, source, env):
+    """Clean the .d files written when SWIFT_EMIT_DEPENDENCIES is set"""
+    if env.get("SWIFT_EMIT_DEPENDENCIES"):
+        objects = [t for t in target if str(t).endswith(".o")]
+        env.Clean(
+            target[0],
+            [
+                _swift_output_base(target, s, objects, i) + ".d"
+                for i, s in enumerate(source)
+            ],
+        )
+        env.Clean(
+            target[0], env.subst("$SWIFT_OUTPUT_FILE_MAP", target=target, source=source)
+        )
+
+    return target, source
+
+def _swift_output_base(target, source, objects, index):
+    """Return the path, without suffix, of the per-source compiler outputs.
+
+    Modules write them next to each object file; programs have no object
+    targets and use <program>-<source> in the target directory.
+    """
+    if objects:
+        return SCons.Util.splitext(objects[index].get_abspath())[0]
+    return os.path.join(
+        target[0].dir.get_abspath(),
+        f"{target[0].name}-{SCons.Util.splitext(source.name)[0]}",
+    )
+
+def _swift_output_file_map(target, source, env):
+    """Write the output-file-map describing the per-source outputs of a module"""
+    objects = [t for t in target if str(t).endswith(".o")]
+    incremental = env.get("SWIFT_INCREMENTAL") and objects
+    dependencies = env.get("SWIFT_EMIT_DEPENDENCIES")
+    if not objects and not dependencies:
+        return 0
+    module_base = SCons.Util.splitext(target[0].get_abspath())[0]
+
+    output_file_map = {}
+    if incremental:
+        output_file_map[""] = {"swift-dependencies": module_base + "-master.swiftdeps"}
+    for i, s in enumerate(source):
+        base = _swift_output_base(target, s, objects, i)
+        entry = {}
+        if objects:
+            entry["object"] = objects[i].get_abspath()
+        if incremental:
+            entry["swift-dependencies"] = base + ".swiftdeps"
+        if dependencies:
+            entry["dependencies"] = base + ".d"
+        output_file_map[s.get_abspath()] = entry
+
+    path = env.subst("$SWIFT_OUTPUT_FILE_MAP", target=target, source=source)
+    contents = json.dumps(output_file_map, indent=2, sort_keys=True)
+    try:
+        with open(path) as f:
+            if f.read() == contents:
+                return 0
+    except OSError:
+        pass
+    with open(path, "w") as f:
+        f.write(contents)
+    return 0
+
+def _parse_dependency_file(path):
+    """Return the prerequisites listed in a Makefile-style .d file"""
+    try:
+        with open(path) as f:
+            contents = f.read()
+    except OSError:
+        return []
+
+    deps = []
+    for rule in contents.replace("\\\n", " ").splitlines():
+        parts = re.split(r"(?<!\\) :(?:\s|$)", rule, 1)
+        if len(parts) < 2:
+            continue
+        for dep in re.findall(r"(?:\\.|[^\s\\])+", parts[1]):
+            deps.append(re.sub(r"\\(.)", r"\1", dep))
+    return deps
+
+def _swift_dependency_file_scan(node, env, path, kind):
+    """Read the .d files swiftc wrote for a target.
+
+    The files swiftc actually read, including C/C++ headers reached through
+    a module.modulemap, become implicit dependencies that SCons records in
+    the .sconsign. The scan runs before a target is built and again, through
+    _swift_record_dependencies, right after swiftc wrote the files.
+    """
+    if not env.get("SWIFT_EMIT_DEPENDENCIES"):
+        return []
+
+    if kind == "program":
+        dep_files = [
+            _swift_output_base([node], s, [], 0) + ".d" for s in node.sources
+        ]
+    elif node.name.endswith(".o"):
+        dep_files = [SCons.Util.splitext(node.get_abspath())[0] + ".d"]
+    else:
+        return []
+
+    deps = []
+    seen = set()
+    for dep_file in dep_files:
+        for dep in _parse_dependency_file(dep_file):
+            # Files deleted since the previous build are no longer needed
+            if dep not in seen and os.path.isfile(dep):
+                seen.add(dep)
+                deps.append(env.fs.File(dep))
+    return deps
+
+SwiftObjectDependencyScanner = SCons.Scanner.ScannerBase(
+    _swift_dependency_file_scan,
+    name="SwiftObjectDependencyScanner",
+    argument="object",
+)
+
+SwiftProgramDependencyScanner = SCons.Scanner.ScannerBase(
+    _swift_dependency_file_scan,
+    name="SwiftProgramDependencyScanner",
+    argument="program",
+)
+
+def _swift_record_dependencies(target, source, env):
+    """Rescan the targets of an action once swiftc has written its .d files.
+
+    SCons stores the implicit dependencies of a target when it finishes
+    building it. Without a rescan these are the ones found before the build,
+    and the files listed in fresh .d files would be new dependencies on the
+    next run, rebuilding the target again.
+    """
+    if not env.get("SWIFT_EMIT_DEPENDENCIES"):
+        return 0
+    executor = target[0].get_executor()
+    for t in executor.get_all_targets():
+        t.implicit = []
+        t.implicit_set = set()
+        t._children_reset()
+    if target[0].builder.source_scanner:
+        executor.scan_sources(target[0].builder.source_scanner)
+    executor.scan_targets(target[0].get_target_scanner())
+    return 0
+
+def _swift_optimization_flag(target, source, env, for_signature):
+    """Return the optimization flag selected by SWIFT_OPTIMIZATION"""
+    mode = env.subst("$SWIFT_OPTIMIZATION")
+    if not mode:
+        return ""
+    if mode not in SwiftOptimizationFlags:
+        raise SCons.Errors.UserError(
+            f"Unknown SWIFT_OPTIMIZATION {mode!r}, expected one of "
+            + ", ".join(SwiftOptimizationFlags)
+        )
+    return SwiftOptimizationFlags[mode]
+
+def _swift_frontend_flags(target, source, env, for_signature):
+    """Return SWIFTFLAGS as swift-frontend arguments.
+
+    Driver-only options are dropped and -Xfrontend arguments are passed on
+    directly.
+    """
+    args = env.subst_list("$SWIFTFLAGS", SCons.Subst.SUBST_RAW)[0]
+    flags = []
+    skip = 0
+    forward = False
+    for arg in map(str, args):
+        if skip:
+            skip -= 1
+        elif forward:
+            flags.append(arg)
+            forward = False
+        elif arg == "-Xfrontend":
+            forward = True
+        elif arg in SwiftDriverOnlyFlags:
+            skip = SwiftDriverOnlyFlags[arg]
+        elif not re.match(r"-j\d+$", arg):
+            flags.append(arg)
+    return flags
+
+def _swift_num_threads(target, source, env, for_signature):
+    """Return the LLVM codegen threads of a whole-module build.
+
+    Derived from the SCons -j budget, and never more than the number of
+    sources since codegen is split into one object per source file.
+    """
+    from SCons.Script import GetOption
+
+    jobs = GetOption("num_jobs") or 1
+    return str(max(1, min(jobs, len(source))))
+
+def _swift_batch_partition(env, source):
+    """Return the batch count and size of a batch-mode compile, or None.
+
+    Without SWIFT_BATCH_COUNT or SWIFT_BATCH_SIZE the sources are split
+    into one batch per SCons job, and never more batches than sources.
+    """
+    sources = [s for s in source if s.get_suffix() in SwiftSuffixes]
+    if not env.get("SWIFT_BATCH_MODE") or env.get("SWIFT_WMO") or not sources:
+        return None
+    from SCons.Script import GetOption
+
+    size = int(env.get("SWIFT_BATCH_SIZE") or 0)
+    count = int(env.get("SWIFT_BATCH_COUNT") or 0)
+    if not count:
+        count = -(-len(sources) // size) if size else GetOption("num_jobs") or 1
+    count = max(1, min(count, len(sources)))
+    return count, size or -(-len(sources) // count)
+
+def _swift_batch_flags(target, source, env, for_signature):
+    """Return the swiftc batch mode flags for SWIFT_BATCH_MODE"""
+    partition = _swift_batch_partition(env, source)
+    if partition is None:
+        return []
+    count, size = partition
+    return [
+        "-enable-batch-mode",
+        "-driver-batch-count",
+        str(count),
+        "-driver-batch-size-limit",
+        str(size),
+        "-j",
+        str(count),
+    ]
+
+def _swift_batch_report(target, source, env, for_signature):
+    """Describe the batch partitioning of a target for SWIFTBATCHSTR"""
+    partition = _swift_batch_partition(env, source)
+    if partition is None:
+        return ""
+    count, size = partition
+    files = len([s for s in source if s.get_suffix() in SwiftSuffixes])
+    return (
+        f"Swift batch mode for {target[0]}: {files} files in {count} "
+        f"batches of up to {size}"
+    )
+
+def _swift_batch_noop(target, source, env):
+    return 0
+
+def _swift_batch_strfunction(target, source, env, executor=None):
+    """Print SWIFTBATCHSTR for batch-mode compiles with SWIFT_BATCH_VERBOSE"""
+    if not env.get("SWIFT_BATCH_VERBOSE") or not _swift_batch_partition(env, source):
+        return None
+    return env.subst("$SWIFTBATCHSTR", SCons.Subst.SUBST_RAW, target, source) or None
+
+def _swift_frontend_io(target, source, env, for_signature):
+    """Return the inputs and object outputs of a frontend job.
+
+    Every module source is an input; the primary files of this job are
+    marked with -primary-file and get one -o each, in order.
+    """
+    primaries = env["_SWIFT_PRIMARY_FILES"]
+    args = []
+    for s in source:
+        if s in primaries:
+            args.append("-primary-file")
+        args.append(s.get_abspath())
+    for t in target:
+        if str(t).endswith(".o"):
+            args.extend(["-o", t.get_abspath()])
+    return args
+
+def _swift_supplementary_output_file_map(target, source, env):
+    """Write the partial module outputs of a frontend job"""
+    suffix = env.subst("$SWIFTMODULESUFFIX")
+    partials = [t for t in target if str(t).endswith("~partial" + suffix)]
+
+    output_file_map = {}
+    for p, partial in zip(env["_SWIFT_PRIMARY_FILES"], partials):
+        base = SCons.Util.splitext(partial.get_abspath())[0]
+        output_file_map[p.get_abspath()] = {
+            "swiftmodule": partial.get_abspath(),
+            "swiftdoc": base + env.subst("$SWIFTDOCSUFFIX"),
+        }
+        if env.get("SWIFT_EMIT_DEPENDENCIES"):
+            output_file_map[p.get_abspath()]["dependencies"] = (
+                base[: -len("~partial")] + ".d"
+            )
+
+    path = env.subst(
+        "$_SWIFT_SUPPLEMENTARY_OUTPUT_FILE_MAP", target=target, source=source
+    )
+    with open(path, "w") as f:
+        json.dump(output_file_map, f, indent=2, sort_keys=True)
+    return 0
+
+def _swift_pipelined_module(env, menv, target, source, kw):
+    """Build a module as an emit-module node and an object node.
+
+    The emit-module node skips non-inlinable function bodies and only
+    writes the .swiftmodule, its side outputs and the C++ header, so
+    dependent modules can start type-checking before the objects exist.
+    """
+    sources = menv.arg2nodes(source, menv.fs.File)
+    module = env._SwiftEmitModule(target, sources, **kw)
+    objects = [_swift_object_node(module[0].dir, s) for s in sources]
+    env._SwiftModuleObjects(objects, sources, **kw)
+    env.Clean(
+        objects[0], menv.subst("$SWIFT_OUTPUT_FILE_MAP", target=objects, source=sources)
+    )
+    _compilation_db_entries.append(
+        (menv, module + objects, sources, "SWIFTMODULECOM")
+    )
+    return module + objects
+
+def SwiftModule(env, target, source=None, **kw):
+    """Build a Swift module.
+
+    By default the whole module is compiled by a single swiftc job. With
+    SWIFT_PIPELINED the .swiftmodule and the objects are built by separate
+    nodes, so dependents only wait for the former. With
+    SWIFT_PARALLEL_FRONTEND the sources are split into batches of
+    SWIFT_FRONTEND_BATCH_SIZE primary files, each compiled by its own
+    frontend node, and the partial modules are merged into the final
+    .swiftmodule. The SCons job scheduler then controls the parallelism.
+    """
+    menv = env.Override(kw)
+    if menv.get("SWIFT_PIPELINED"):
+        return _swift_pipelined_module(env, menv, target, source, kw)
+    # Whole-module builds always compile the module as one job
+    if not menv.get("SWIFT_PARALLEL_FRONTEND") or menv.get("SWIFT_WMO"):
+        return env._SwiftModule(target, source, **kw)
+
+    sources = menv.arg2nodes(source, menv.fs.File)
+    target_dir = menv.arg2nodes(target, menv.fs.File)[0].dir
+    batch_size = max(1, int(menv.get("SWIFT_FRONTEND_BATCH_SIZE") or 1))
+    suffix = menv.subst("$SWIFTMODULESUFFIX")
+
+    objects = []
+    partials = []
+    for i in range(0, len(sources), batch_size):
+        primaries = sources[i : i + batch_size]
+        batch_objects = [_swift_object_node(target_dir, p) for p in primaries]
+        bases = [SCons.Util.splitext(str(o))[0] for o in batch_objects]
+        batch_partials = [menv.File(b + "~partial" + suffix) for b in bases]
+        docs = [
+            menv.File(b + "~partial" + menv.subst("$SWIFTDOCSUFFIX")) for b in bases
+        ]
+        env._SwiftFrontend(
+            batch_objects + batch_partials + docs,
+            sources,
+            _SWIFT_PRIMARY_FILES=primaries,
+            **kw,
+        )
+        env.Clean(
+            batch_objects[0],
+            [
+                menv.subst(
+                    "$_SWIFT_SUPPLEMENTARY_OUTPUT_FILE_MAP",
+                    target=batch_objects,
+                    source=primaries,
+                )
+            ]
+            + [b + ".d" for b in bases],
+        )
+        objects.extend(batch_objects)
+        partials.extend(batch_partials)
+
+    module = env._SwiftMergeModules(target, partials, **kw)
+    _compilation_db_entries.append(
+        (menv, module + objects, sources, "SWIFTMODULECOM")
+    )
+    return module + objects
+
+def SwiftInterfaceDecider(env):
+    """Decide .swiftmodule dependencies by their public interface.
+
+    The import scanner adds the .swiftinterface of an imported module as a
+    dependency too. With this decider a .swiftmodule that was seen before
+    is only considered changed through that file, so edits limited to
+    function bodies do not rebuild its dependents. The .swiftinterface
+    carries @inlinable bodies, but not the bodies -O serializes for
+    cross-module optimization, so modules without one, or built or imported
+    with SWIFT_OPTIMIZATION, use the environment's existing decider like
+    all other dependencies.
+    """
+
+    def interface_decides(dependency, interface):
+        if interface is None or not interface.name.endswith(
+            env.subst("$SWIFTINTERFACESUFFIX")
+        ):
+            return False
+        envs = [env]
+        if dependency.has_builder():
+            envs.append(dependency.get_build_env())
+        return all(e.subst("$SWIFT_OPTIMIZATION") in ("", "none") for e in envs)
+
+    def interface_decider(decide):
+        def decide_swift(dependency, target, prev_ni, repo_node=None):
+            interface = _swift_interface_node(dependency, env)
+            if (
+                interface_decides(dependency, interface)
+                and getattr(prev_ni, "csig", None)
+                and interface in target.children()
+            ):
+                return False
+            return decide(dependency, target, prev_ni, repo_node)
+
+        return decide_swift
+
+    env.decide_source = interface_decider(env.decide_source)
+    env.decide_target = interface_decider(env.decide_target)
+
+def _quote_response_arg(arg):
+    """Quote an argument for a swiftc response file"""
+    if arg and not re.search(r"[\s\"'\\]", arg):
+        return arg
+    return '"' + arg.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+class _SwiftResponseFile:
+    """Moves the arguments of a long Swift command line into a response file.
+
+    Used like TEMPFILE: ${_SWIFTRESPONSEFILE('$SWIFTMODULECOM')}. Commands
+    longer than SWIFT_RESPONSE_FILE_THRESHOLD characters are run as
+    `swiftc @<target>.rsp`. The response file is kept and only rewritten
+    when its content changes, and not written at all when actions are only
+    printed (scons -n).
+    """
+
+    def __init__(self, cmd):
+        self.cmd = cmd
+
+    def __call__(self, target, source, env, for_signature):
+        if for_signature:
+            return self.cmd
+
+        threshold = env.subst("$SWIFT_RESPONSE_FILE_THRESHOLD")
+        threshold = int(threshold) if threshold else 128000
+        cmd = env.subst_list(self.cmd, SCons.Subst.SUBST_CMD, target, source)[0]
+        args = [str(a) for a in cmd]
+        if not threshold or sum(len(a) + 1 for a in args) <= threshold:
+            return self.cmd
+
+        path = env.subst("$SWIFT_RESPONSE_FILE", target=target, source=source)
+        if not SCons.Action.execute_actions:
+            return [args[0], "@" + path]
+        contents = "\n".join(_quote_response_arg(a) for a in args[1:]) + "\n"
+        try:
+            with open(path) as f:
+                unchanged = f.read() == contents
+        except OSError:
+            unchanged = False
+        if not unchanged:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as f:
+                f.write(contents)
+        return [args[0], "@" + path]
+
+def _swift_command_action(com):
+    """Return the action running $<com>, using a response file when it is long"""
+    return SCons.Action.Action(
+        "${_SWIFTRESPONSEFILE('$%s')}" % com, "$%sSTR" % com
+    )
+
+def _swift_response_file_emitter(target, source, env):
+    env.Clean(
+        target[0], env.subst("$SWIFT_RESPONSE_FILE", target=target, source=source)
+    )
+    return target, source
+
+class _SwiftTracer:
+    """Collects Chrome trace events for Swift actions.
+
+    Each build thread is one lane (tid), so with -j the trace shows which
+    jobs ran concurrently and where slots were idle. The events are written
+    to their SWIFT_TRACE_FILE at exit.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.events = {}
+        self.lanes = {}
+        self.epoch = time.time()
+        atexit.register(self.write)
+
+    def start(self, target, path):
+        self.local.record = {
+            "path": path,
+            "name": str(target[0]),
+            "start": time.time(),
+            "user": 0.0,
+            "sys": 0.0,
+            "max_rss": 0,
+        }
+
+    def finish(self, target):
+        record = getattr(self.local, "record", None)
+        self.local.record = None
+        if record is None:
+            return
+
+        end = time.time()
+        output_bytes = 0
+        for t in target:
+            try:
+                output_bytes += os.path.getsize(t.get_abspath())
+            except OSError:
+                pass
+
+        with self.lock:
+            lane = self.lanes.setdefault(threading.get_ident(), len(self.lanes) + 1)
+            self.events.setdefault(record["path"], []).append(
+                {
+                    "name": record["name"],
+                    "cat": "swift",
+                    "ph": "X",
+                    "pid": 1,
+                    "tid": lane,
+                    "ts": int((record["start"] - self.epoch) * 1e6),
+                    "dur": int((end - record["start"]) * 1e6),
+                    "args": {
+                        "user_s": round(record["user"], 3),
+                        "sys_s": round(record["sys"], 3),
+                        "max_rss_bytes": record["max_rss"],
+                        "output_bytes": output_bytes,
+                        "targets": [str(t) for t in target],
+                    },
+                }
+            )
+
+    def record_usage(self, usage):
+        record = getattr(self.local, "record", None)
+        if record is None:
+            return
+        record["user"] += usage.ru_utime
+        record["sys"] += usage.ru_stime
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+        scale = 1 if sys.platform == "darwin" else 1024
+        record["max_rss"] = max(record["max_rss"], usage.ru_maxrss * scale)
+
+    def tracing(self):
+        return getattr(self.local, "record", None) is not None
+
+    def write(self):
+        for path, events in self.events.items():
+            try:
+                with open(path, "w") as f:
+                    json.dump(
+                        {"traceEvents": events, "displayTimeUnit": "ms"}, f, indent=1
+                    )
+            except OSError:
+                pass
+
+
+_tracer = _SwiftTracer()
+
+# Type-checker timing lines: "<ms>ms<TAB><file>:<line>:<col>[<TAB><decl>]"
+SwiftTimingRE = re.compile(r"^\s*([\d.]+)ms\t(.+?):(\d+):(\d+)(?:\t(.*))?$")
+
+class _SwiftCompileStats:
+    """Collects swiftc statistics and type-checking times of built targets.
+
+    The frontend timing output of each target is captured from stderr into
+    its stats directory, next to the -stats-output-dir JSON files. At exit
+    all targets built in this run are summarized in a ranked report.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.targets = {}
+        self.top = {}
+        atexit.register(self.write)
+
+    def start(self, target, stats_dir, report, top):
+        os.makedirs(stats_dir, exist_ok=True)
+        log = os.path.join(stats_dir, "type-check-times.txt")
+        # Only keep the output of the latest compile of this target
+        open(log, "w").close()
+        self.local.log = log
+        with self.lock:
+            self.targets.setdefault(report, {})[str(target[0])] = stats_dir
+            self.top[report] = top
+
+    def finish(self):
+        self.local.log = None
+
+    def capture_log(self):
+        return getattr(self.local, "log", None)
+
+    def write(self):
+        for report, targets in self.targets.items():
+            top = self.top[report]
+            functions = []
+            expressions = []
+            lines = []
+            for name, stats_dir in sorted(targets.items()):
+                file_times = {}
+                try:
+                    with open(os.path.join(stats_dir, "type-check-times.txt")) as f:
+                        timings = f.read().splitlines()
+                except OSError:
+                    timings = []
+                for line in timings:
+                    m = SwiftTimingRE.match(line)
+                    if not m:
+                        continue
+                    ms = float(m.group(1))
+                    location = f"{m.group(2)}:{m.group(3)}:{m.group(4)}"
+                    if m.group(5) is None:
+                        expressions.append((ms, location, ""))
+                    else:
+                        functions.append((ms, location, m.group(5)))
+                        file_times[m.group(2)] = file_times.get(m.group(2), 0.0) + ms
+
+                jobs = []
+                for stats_file in os.listdir(stats_dir) if os.path.isdir(stats_dir) else []:
+                    if not stats_file.endswith(".json"):
+                        continue
+                    try:
+                        with open(os.path.join(stats_dir, stats_file)) as f:
+                            counters = json.load(f)
+                    except (OSError, ValueError):
+                        continue
+                    wall = [
+                        v
+                        for k, v in counters.items()
+                        if k.startswith("time.swift") and k.endswith(".wall")
+                    ]
+                    if wall:
+                        jobs.append((max(wall), stats_file))
+
+                lines.append(f"== {name}")
+                lines.append("Slowest files (type-checking function bodies):")
+                for path, ms in sorted(file_times.items(), key=lambda i: -i[1])[:top]:
+                    lines.append(f"  {ms:10.1f}ms  {path}")
+                if jobs:
+                    lines.append("Slowest frontend jobs (wall time):")
+                    for wall, stats_file in sorted(jobs, reverse=True)[:top]:
+                        lines.append(f"  {wall * 1000:10.1f}ms  {stats_file}")
+                lines.append("")
+
+            header = ["Slowest functions:"]
+            for ms, location, decl in sorted(functions, reverse=True)[:top]:
+                header.append(f"  {ms:10.1f}ms  {location}  {decl}")
+            header.append("Slowest expressions:")
+            for ms, location, _ in sorted(expressions, reverse=True)[:top]:
+                header.append(f"  {ms:10.1f}ms  {location}")
+            header.append("")
+
+            try:
+                with open(report, "w") as f:
+                    f.write("\n".join(header + lines) + "\n")
+            except OSError:
+                continue
+            print(f"Swift compile statistics written to {report}")
+
+
+_compile_stats = _SwiftCompileStats()
+
+class _SwiftSpawn:
+    """SPAWN wrapper instrumenting the commands of Swift actions.
+
+    For traced actions os.wait4 measures the CPU time and peak RSS of the
+    swiftc process and the frontend jobs it waited for. For actions with
+    compile statistics, stderr is copied into the target's stats directory.
+    Other commands, and platforms without wait4, use the wrapped SPAWN.
+    """
+
+    def __init__(self, spawn):
+        self.spawn = spawn
+
+    def __call__(self, sh, escape, cmd, args, env):
+        log = _compile_stats.capture_log()
+        if not (_tracer.tracing() or log) or not hasattr(os, "wait4"):
+            return self.spawn(sh, escape, cmd, args, env)
+
+        import subprocess
+
+        proc = subprocess.Popen(
+            [sh, "-c", " ".join(args)],
+            env=env,
+            close_fds=True,
+            stderr=subprocess.PIPE if log else None,
+        )
+        if log:
+            with open(log, "ab") as f:
+                for line in proc.stderr:
+                    f.write(line)
+                    # Timing lines are only kept in the report
+                    if not SwiftTimingRE.match(line.decode(errors="replace")):
+                        sys.stderr.write(line.decode(errors="replace"))
+            proc.stderr.close()
+        _, status, usage = os.wait4(proc.pid, 0)
+        if os.WIFSIGNALED(status):
+            proc.returncode = -os.WTERMSIG(status)
+        else:
+            proc.returncode = os.WEXITSTATUS(status)
+        _tracer.record_usage(usage)
+        return proc.returncode
+
+def _swift_action_start(target, source, env):
+    if env.get("SWIFT_TRACE_FILE"):
+        _tracer.start(target, env.File(env.subst("$SWIFT_TRACE_FILE")).get_abspath())
+    if env.get("SWIFT_COMPILE_STATS"):
+        _compile_stats.start(
+            target,
+            env.subst("$SWIFT_STATS_DIR", target=target, source=source),
+            env.File(env.subst("$SWIFT_COMPILE_STATS_REPORT")).get_abspath(),
+            int(env.subst("$SWIFT_COMPILE_STATS_TOP") or 20),
+        )
+    return 0
+
+def _swift_action_finish(target, source, env):
+    _tracer.finish(target)
+    _compile_stats.finish()
+    return 0
+
+def _swift_instrumented_actions(*actions):
+    """Return an action list that records SWIFT_TRACE_FILE events and
+    SWIFT_COMPILE_STATS output for the action"""
+    return (
+        [SCons.Action.Action(_swift_action_start, None)]
+        + list(actions)
+        + [SCons.Action.Action(_swift_action_finish, None)]
+    )
+
+def _swift_instrument_emitter(target, source, env):
+    """Clean the statistics directory of instrumented targets"""
+    if env.get("SWIFT_COMPILE_STATS"):
+        env.Clean(
+            target[0],
+            env.Dir(env.subst("$SWIFT_STATS_DIR", target=target, source=source)),
+        )
+    return target, source
+
+# Swift compile commands for SwiftCompilationDatabase:
+# (environment, targets, sources, command variable)
+_compilation_db_entries = []
+
+def _swift_compilation_db_emitter(com):
+    """Return an emitter recording the compile command of each source"""
+
+    def emitter(target, source, env):
+        _compilation_db_entries.append((env, target, source, com))
+        return target, source
+
+    return emitter
+
+def _swift_compilation_db_commands():
+    """Return the compile_commands.json entries of all Swift builder calls"""
+    entries = []
+    seen = set()
+    for entry_env, entry_target, entry_source, com in _compilation_db_entries:
+        cmd = entry_env.subst_list(
+            "$" + com, SCons.Subst.SUBST_CMD, entry_target, entry_source
+        )[0]
+        arguments = [str(a) for a in cmd]
+        directory = entry_env.Dir("#").get_abspath()
+        objects = [t for t in entry_target if str(t).endswith(".o")]
+        for i, s in enumerate(entry_source):
+            path = s.get_abspath()
+            if path in seen:
+                continue
+            seen.add(path)
+            entry = {"directory": directory, "file": path, "arguments": arguments}
+            if i < len(objects):
+                entry["output"] = objects[i].get_abspath()
+            entries.append(entry)
+    return entries
+
+class _SwiftCompilationDbValue(SCons.Node.Python.Value):
+    """Value node standing for the Swift compile commands of the build.
+
+    The entries are substituted once, when SCons first checks the database
+    after all SConscripts were read, and its signature is their hash, so
+    the database is only rebuilt when a command line changes.
+    """
+
+    def __init__(self):
+        super().__init__("swift-compilation-db", name="swift-compilation-db")
+        self.entries = None
+
+    def read_entries(self):
+        if self.entries is None:
+            self.entries = _swift_compilation_db_commands()
+        return self.entries
+
+    def get_text_contents(self):
+        return SCons.Util.hash_signature(
+            json.dumps(self.read_entries(), sort_keys=True)
+        )
+
+_compilation_db_value = None
+
+def _swift_write_compilation_db(target, source, env):
+    """Write compile_commands.json entries for every Swift source.
+
+    Entries of the other sources (compilation databases of other tools) are
+    merged in. The file is only rewritten when its content changes, so
+    editors watching it do not re-index needlessly.
+    """
+    entries = []
+    swift_entries = []
+    for s in source:
+        if isinstance(s, _SwiftCompilationDbValue):
+            swift_entries = s.read_entries()
+        else:
+            with open(s.get_abspath()) as f:
+                entries.extend(json.load(f))
+
+    seen = set(e.get("file") for e in entries)
+    entries.extend(e for e in swift_entries if e["file"] not in seen)
+
+    path = target[0].get_abspath()
+    contents = json.dumps(entries, indent=2) + "\n"
+    try:
+        with open(path) as f:
+            if f.read() == contents:
+                return 0
+    except OSError:
+        pass
+    with open(path, "w") as f:
+        f.write(contents)
+    return 0
+
+def SwiftCompilationDatabase(env, target=None, source=None, **kw):
+    """Build a compile_commands.json covering all Swift builder calls.
+
+    Pass the output of SCons' CompilationDatabase() as source to merge the
+    C and C++ entries into the same file.
+    """
+    global _compilation_db_value
+
+    if target is None:
+        target = "compile_commands.json"
+    if _compilation_db_value is None:
+        _compilation_db_value = _SwiftCompilationDbValue()
+    db = env._SwiftCompilationDatabase(
+        target, env.Flatten([source or [], _compilation_db_value]), **kw
+    )
+    env.Precious(db)
+    env.NoCache(db)
+    return db
+
+def _swift_library_module(env, target, source, kw):
+    """Return the module nodes a Swift library is built from.
+
+    `source` is either the nodes returned by SwiftModule, or Swift sources
+    that are first compiled into a module named after the target.
+    """
+    suffix = env.subst("$SWIFTMODULESUFFIX")
+    nodes = env.arg2nodes(source, env.fs.File)
+    if any(str(n).endswith(suffix) for n in nodes):
+        return nodes
+
+    if not env.Override(kw).get("SWIFTMODULENAME"):
+        name = os.path.basename(str(SCons.Util.flatten([target])[0]))
+        kw = dict(kw, SWIFTMODULENAME=name)
+    return env.SwiftModule(target, nodes, **kw)
+
+# Whether an archiver creates thin archives with T, keyed by path
+_thin_archivers = {}
+
+def _swift_check_thin_archiver(env):
+    """Raise a UserError unless $AR is GNU ar or llvm-ar.
+
+    Other archivers, such as Apple's ar, read T as a different option and
+    quietly create regular archives.
+    """
+    import subprocess
+
+    ar = env.subst("$AR")
+    path = env.WhereIs(ar) or ar
+    if path not in _thin_archivers:
+        try:
+            result = subprocess.run(
+                [path, "--version"], capture_output=True, text=True
+            )
+            output = result.stdout if result.returncode == 0 else ""
+        except OSError:
+            output = ""
+        _thin_archivers[path] = "GNU ar" in output or "LLVM" in output
+    if not _thin_archivers[path]:
+        raise SCons.Errors.UserError(
+            f"SWIFT_THIN_ARCHIVE needs GNU ar or llvm-ar, but AR is {ar!r}; "
+            "set AR='llvm-ar' or disable SWIFT_THIN_ARCHIVE"
+        )
+
+def SwiftStaticLibrary(env, target, source=None, **kw):
+    """Build a static library from the objects of a Swift module.
+
+    Returns the library followed by the module nodes (.swiftmodule, the
+    generated C++ header and the objects). With SWIFT_THIN_ARCHIVE the
+    archive references the objects instead of copying them, which needs
+    GNU ar or llvm-ar as AR.
+    """
+    module = _swift_library_module(env, target, source, kw)
+    objects = [n for n in module if str(n).endswith(".o")]
+    if env.Override(kw).get("SWIFT_THIN_ARCHIVE"):
+        _swift_check_thin_archiver(env.Override(kw))
+        kw = dict(kw, ARFLAGS="$SWIFT_THIN_ARFLAGS")
+    return env.StaticLibrary(target, objects, **kw) + module
 
+def SwiftSharedLibrary(env, target, source=None, **kw):
+    """Link a shared library from the objects of a Swift module with swiftc.
+
+    Returns the library followed by the module nodes.
+    """
+    module = _swift_library_module(env, target, source, kw)
+    objects = [n for n in module if str(n).endswith(".o")]
+    return env._SwiftSharedLink(target, objects, **kw) + module
+
+def _swift_module_deps(env):
+    """Split the nodes in SWIFTMODULES into modules, libraries and objects"""
+    module_suffix = env.subst("$SWIFTMODULESUFFIX")
+    library_suffixes = (env.subst("$LIBSUFFIX"), env.subst("$SHLIBSUFFIX"))
+    modules, libraries, objects = [], [], []
+    nodes = SCons.Util.flatten(env.get("SWIFTMODULES", []))
+    for node in env.arg2nodes(nodes, env.fs.File):
+        name = str(node)
+        if name.endswith(module_suffix):
+            modules.append(node)
+        elif name.endswith(library_suffixes):
+            libraries.append(node)
+        elif name.endswith(".o"):
+            objects.append(node)
+    return modules, libraries, objects
+
+def _swift_modules_inc_flags(target, source, env, for_signature):
+    """Return the search path flags for the modules in SWIFTMODULES"""
+    modules = _swift_module_deps(env)[0]
+    flags = []
+    for d in SCons.Util.unique([m.dir for m in modules]):
+        flags.extend(["-I", d.get_abspath()])
+    return flags
+
+def _swift_modules_link_nodes(env):
+    """Return the nodes linking the modules in SWIFTMODULES.
+
+    Each module is linked through its library if SWIFTMODULES has one, and
+    through its objects otherwise, so libraries and bare modules mix.
+    """
+    _, libraries, objects = _swift_module_deps(env)
+    archived = set()
+    for library in libraries:
+        archived.update(library.sources)
+    return libraries + [o for o in objects if o not in archived]
+
+def _swift_modules_link_flags(target, source, env, for_signature):
+    """Return the libraries and bare module objects of SWIFTMODULES"""
+    return [n.get_abspath() for n in _swift_modules_link_nodes(env)]
+
+def _swift_modules_emitter(link):
+    """Return an emitter making the targets depend on SWIFTMODULES.
+
+    Compiling only needs the .swiftmodule and its interface files; linking
+    also needs the libraries, and the objects of modules without one.
+    """
+
+    def emitter(target, source, env):
+        modules = _swift_module_deps(env)[0]
+        deps = list(modules)
+        for m in modules:
+            interface = _swift_interface_node(m, env)
+            if interface is not None:
+                deps.append(interface)
+        if link:
+            deps.extend(_swift_modules_link_nodes(env))
+        if deps:
+            env.Depends(target, deps)
+        return target, source
+
+    return emitter
+
+def _swift_module_cache_flags(target, source, env, for_signature):
+    """Return the -module-cache-path flag for SWIFT_MODULE_CACHE_PATH"""
+    path = env.subst("$SWIFT_MODULE_CACHE_PATH")
+    if not path:
+        return []
+    return ["-module-cache-path", env.Dir(path).get_abspath()]
+
+def _swift_module_cache_emitter(target, source, env):
+    """Remove the shared module cache with scons -c"""
+    path = env.subst("$SWIFT_MODULE_CACHE_PATH")
+    if path:
+        env.Clean(target[0], env.Dir(path))
     return target, source
 
+def _swift_module_cache_imports(target, source, env):
+    """Write a Swift file importing every module of the modulemap"""
+    with open(target[0].get_abspath() + ".swift", "w") as f:
+        for name in _modulemap_modules(source[0]):
+            f.write(f"import {name}\n")
+    return 0
+
+def _swift_module_cache_stamp(target, source, env):
+    """Record the warmed modules in the stamp file"""
+    with open(target[0].get_abspath(), "w") as f:
+        f.write(" ".join(_modulemap_modules(source[0])) + "\n")
+    return 0
+
+def SwiftModuleCache(env, source, **kw):
+    """Build the Clang modules of module.modulemap files into the module cache.
+
+    Each modulemap gets its own node that type-checks a file importing all
+    of its modules, so the PCMs are built once before the targets using
+    them start in parallel. Swift sources importing one of those modules
+    depend on the node through the import scanner. The flags must match
+    those of the importing targets, or Clang builds separate PCMs.
+    """
+    menv = env.Override(kw)
+    cache = menv.Dir(menv.subst("$SWIFT_MODULE_CACHE_PATH"))
+    stamps = []
+    for modulemap in menv.arg2nodes(source, menv.fs.File):
+        path = modulemap.get_abspath()
+        name = f"{modulemap.dir.name}-{SCons.Util.hash_signature(path)[:12]}.stamp"
+        stamp = env._SwiftModuleCacheWarm(cache.File(name), modulemap, **kw)
+        env.Clean(stamp, stamp[0].get_abspath() + ".swift")
+        _module_cache_stamps[path] = stamp[0]
+        stamps.extend(stamp)
+    return stamps
+
+# Bridging header and precompiled header of each target, keyed by target path
+_bridging_headers = {}
+
+# Bridging PCH nodes, keyed by path
+_bridging_pch_nodes = {}
+
+def _swift_bridging_pch(env, header):
+    """Return the node precompiling a bridging header.
+
+    The PCH is named after the header and the flags it is built with, so
+    every target using the same header and flags shares one node.
+    """
+    flags = env.subst("$SWIFTFLAGS $SWIFTPCHFLAGS $_SWIFTCOMCOM", SCons.Subst.SUBST_SIG)
+    key = SCons.Util.hash_signature(header.get_abspath() + "\0" + flags)
+    path = env.Dir("$SWIFT_BRIDGING_PCH_DIR").File(f"{header.name}-{key[:12]}.pch")
+    node = _bridging_pch_nodes.get(path.get_abspath())
+    if node is None:
+        node = env._SwiftBridgingPCH(path, header)[0]
+        _bridging_pch_nodes[path.get_abspath()] = node
+    return node
+
+def _swift_bridging_header_emitter(target, source, env):
+    """Make the targets depend on SWIFT_BRIDGING_HEADER or its PCH"""
+    header = env.subst("$SWIFT_BRIDGING_HEADER")
+    if not header:
+        return target, source
+    header = env.File(header)
+    pch = _swift_bridging_pch(env, header) if env.get("SWIFT_BRIDGING_PCH") else None
+    env.Depends(target, pch or header)
+    for t in target:
+        _bridging_headers[t.get_abspath()] = (header, pch)
+    return target, source
+
+def _swift_bridging_header_flags(frontend):
+    """Return a generator of the bridging header flags of a target"""
+
+    def flags(target, source, env, for_signature):
+        entry = _bridging_headers.get(target[0].get_abspath()) if target else None
+        if entry is None:
+            return []
+        header, pch = entry
+        if pch is not None and env.get("SWIFT_BRIDGING_PCH"):
+            # The driver must not precompile the header again
+            return ["-import-objc-header", pch.get_abspath()] + (
+                [] if frontend else ["-disable-bridging-pch"]
+            )
+        return ["-import-objc-header", header.get_abspath()]
+
+    return flags
+
+# -scan-dependencies output, keyed by compiler and command line, with the
+# source signatures and input file stamps it was computed from
+_scan_cache = _SideCache("scans")
+
+# Explicit module nodes and the map entries they need, keyed by kind, name
+# and context hash
+_explicit_module_nodes = {}
+
+# Explicit module map nodes, keyed by path
+_explicit_module_map_nodes = {}
+
+# Explicit module map used by each target, keyed by target path
+_explicit_module_maps = {}
+
+# Module details naming files a scan graph was computed from
+_ScanInputFields = ("moduleMapPath", "moduleInterfacePath", "compiledModulePath")
+
+def _swift_file_stamp(path):
+    """Return the size and modification time of path, or None if missing"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return f"{st.st_size}:{st.st_mtime_ns}"
+
+def _swift_scan_inputs(scan, sources):
+    """Return the stamps of the module inputs a scan graph was computed from.
+
+    These are the source files, module maps, textual interfaces and
+    prebuilt modules of every module in the graph, other than the paths in
+    sources, which are checked by content.
+    """
+    paths = set()
+    graph = scan.get("modules", [])
+    for info in graph[1::2]:
+        paths.update(info.get("sourceFiles", []))
+        for details in info.get("details", {}).values():
+            paths.update(
+                details[field] for field in _ScanInputFields if details.get(field)
+            )
+    return {
+        path: _swift_file_stamp(path)
+        for path in sorted(paths)
+        if path not in sources
+    }
+
+def _swift_scan_dependencies(env, target, sources):
+    """Return the swiftc -scan-dependencies graph of sources, or None.
+
+    Results are cached next to the .sconsign database, so the scanner only
+    runs again when the compiler, the command line, a source or one of the
+    module maps, interfaces and other files the graph was computed from
+    changes.
+    """
+    import subprocess
+
+    cmd = env.subst_list(
+        "$SWIFTSCANCOM", SCons.Subst.SUBST_CMD, target=target, source=sources
+    )[0]
+    cmd = [str(arg) for arg in cmd]
+    key = SCons.Util.hash_signature("\0".join([env.subst("$SWIFTVERSION")] + cmd))
+    csigs = {s.get_abspath(): s.get_csig() for s in sources}
+    entry = _scan_cache.get(env, key)
+    if (
+        isinstance(entry, dict)
+        and entry.get("sources") == csigs
+        and all(
+            _swift_file_stamp(path) == stamp
+            for path, stamp in entry.get("inputs", {}).items()
+        )
+    ):
+        return entry.get("graph")
+
+    scan = None
+    try:
+        result = subprocess.run(
+            cmd,
+            capture_output=True,
+            text=True,
+            env={k: str(v) for k, v in env["ENV"].items()},
+        )
+        if result.returncode == 0:
+            scan = json.loads(result.stdout)
+    except (OSError, ValueError):
+        pass
+    if scan is None:
+        return None
+    _scan_cache.set(
+        env,
+        key,
+        {"sources": csigs, "inputs": _swift_scan_inputs(scan, csigs), "graph": scan},
+    )
+    return scan
+
+def _scan_module_id(module_id):
+    """Return a module identifier of the scan graph as a (kind, name) tuple"""
+    return next(iter(module_id.items()))
+
+def _explicit_module_args(args, source):
+    """Return the scanned command line without its input and output paths"""
+    result = []
+    skip = False
+    for arg in args:
+        if skip:
+            skip = False
+        elif arg == "-o":
+            skip = True
+        elif arg not in ("-frontend", source):
+            result.append(SCons.Subst.Literal(arg))
+    return result
+
+def _swift_explicit_module_map(env, entries):
+    """Return the node of an explicit module map file listing entries"""
+    text = json.dumps([entries[key] for key in sorted(entries)], indent=2)
+    out_dir = env.Dir("$SWIFT_EXPLICIT_MODULES_DIR")
+    path = out_dir.File(f"map-{SCons.Util.hash_signature(text)[:16]}.json")
+    node = _explicit_module_map_nodes.get(path.get_abspath())
+    if node is None:
+        node = env._SwiftExplicitModuleMap(path, env.Value(text))[0]
+        _explicit_module_map_nodes[path.get_abspath()] = node
+    return node
+
+def _swift_write_explicit_module_map(target, source, env):
+    """Write an explicit module map from its Value node"""
+    with open(target[0].get_abspath(), "w") as f:
+        f.write(source[0].get_text_contents())
+    return 0
+
+def _swift_explicit_module(env, modules, module_id):
+    """Return the node building a module of the scan graph and its map entries.
+
+    Every module is built once per context hash, the scanner's digest of the
+    flags it depends on, and shared by all targets that import it. The map
+    entries cover the module and its transitive dependencies.
+    """
+    kind, name = module_id
+    info = modules.get(module_id)
+    if info is None:
+        return None
+    details = info.get("details", {}).get(kind, {})
+    if kind == "swiftPrebuiltExternal":
+        path = details["compiledModulePath"]
+        entry = {
+            "moduleName": name,
+            "modulePath": path,
+            "isFramework": details.get("isFramework", False),
+        }
+        return env.File(path), {("swift", name): entry}
+    if kind not in ("swift", "clang"):
+        return None
+
+    context = details.get("contextHash", "")
+    key = (kind, name, context)
+    if key in _explicit_module_nodes:
+        return _explicit_module_nodes[key]
+
+    deps = []
+    entries = {}
+    for dep in info.get("directDependencies", []):
+        record = _swift_explicit_module(env, modules, _scan_module_id(dep))
+        if record is not None:
+            deps.append(record[0])
+            entries.update(record[1])
+
+    out_dir = env.Dir("$SWIFT_EXPLICIT_MODULES_DIR")
+    base = f"{name}-{context}" if context else name
+    if kind == "clang":
+        modulemap = details["moduleMapPath"]
+        pcm_deps = []
+        for entry in entries.values():
+            if "clangModulePath" in entry:
+                pcm_deps += [
+                    "-Xcc",
+                    f"-fmodule-file={entry['moduleName']}={entry['clangModulePath']}",
+                ]
+        node = env._SwiftEmitPCM(
+            out_dir.File(base + ".pcm"),
+            env.File(modulemap),
+            SWIFT_EXPLICIT_MODULE_NAME=name,
+            SWIFT_EXPLICIT_MODULE_ARGS=_explicit_module_args(
+                details.get("commandLine", []), modulemap
+            ),
+            _SWIFT_EXPLICIT_PCM_DEPS=pcm_deps,
+        )[0]
+        own = {
+            "moduleName": name,
+            "clangModulePath": node.get_abspath(),
+            "clangModuleMapPath": modulemap,
+            "isFramework": False,
+        }
+    else:
+        interface = details["moduleInterfacePath"]
+        node = env._SwiftCompileInterface(
+            out_dir.File(base + env.subst("$SWIFTMODULESUFFIX")),
+            [env.File(interface), _swift_explicit_module_map(env, entries)],
+            SWIFT_EXPLICIT_MODULE_NAME=name,
+            SWIFT_EXPLICIT_MODULE_ARGS=_explicit_module_args(
+                details.get("commandLine", []), interface
+            ),
+        )[0]
+        own = {
+            "moduleName": name,
+            "modulePath": node.get_abspath(),
+            "isFramework": details.get("isFramework", False),
+        }
+    env.Depends(node, deps)
+    entries[(kind, name)] = own
+    record = (node, entries)
+    _explicit_module_nodes[key] = record
+    return record
+
+def _swift_explicit_modules_emitter(flags):
+    """Return an emitter building the modules the sources import explicitly.
+
+    The sources are scanned with swiftc -scan-dependencies plus the builder's
+    flags variable, every Swift and Clang module they need becomes its own
+    node, and the targets depend on those nodes and on the module map that
+    _SWIFT_EXPLICIT_MODULE_FLAGS passes to the compiler. Sources that do not
+    exist yet, or fail to scan, keep implicit module builds.
+    """
+
+    def emitter(target, source, env):
+        if not env.get("SWIFT_EXPLICIT_MODULES"):
+            return target, source
+        sources = [s for s in source if s.get_suffix() in SwiftSuffixes]
+        if not sources or not all(s.rexists() for s in sources):
+            return target, source
+        scan = _swift_scan_dependencies(
+            env.Override(
+                {"_SWIFTSCANBUILDERFLAGS": f"${flags}", "SWIFT_BRIDGING_PCH": False}
+            ),
+            target,
+            sources,
+        )
+        if scan is None:
+            return target, source
+
+        modules = {}
+        graph = scan.get("modules", [])
+        for i in range(0, len(graph) - 1, 2):
+            modules[_scan_module_id(graph[i])] = graph[i + 1]
+        main = modules.get(("swift", scan.get("mainModuleName")), {})
+
+        deps = []
+        entries = {}
+        for dep in main.get("directDependencies", []):
+            record = _swift_explicit_module(env, modules, _scan_module_id(dep))
+            if record is not None:
+                deps.append(record[0])
+                entries.update(record[1])
+        module_map = _swift_explicit_module_map(env, entries)
+        env.Depends(target, deps + [module_map])
+        env.Clean(target[0], env.Dir("$SWIFT_EXPLICIT_MODULES_DIR"))
+        for t in target:
+            _explicit_module_maps[t.get_abspath()] = module_map
+        return target, source
+
+    return emitter
+
+def _swift_explicit_module_flags(frontend):
+    """Return a generator of the explicit module flags of a target"""
+
+    def flags(target, source, env, for_signature):
+        module_map = _explicit_module_maps.get(target[0].get_abspath()) if target else None
+        if module_map is None:
+            return []
+        swift_flags = [
+            "-disable-implicit-swift-modules",
+            "-explicit-swift-module-map-file",
+            module_map.get_abspath(),
+        ]
+        if not frontend:
+            swift_flags = [f for arg in swift_flags for f in ("-Xfrontend", arg)]
+        return swift_flags + [
+            "-Xcc",
+            "-fno-implicit-modules",
+            "-Xcc",
+            "-fno-implicit-module-maps",
+        ]
+
+    return flags
+
 def _detect_swift_version(env, swift):
     """Detect Swift compiler version"""
     import subprocess
@@ -101,6 +1792,88 @@ def _detect_swift_version(env, swift):
         pass
     return None
 
+def _detect_swift_target_info(env, swift):
+    """Return the parsed output of swiftc -print-target-info"""
+    import subprocess
+
+    try:
+        result = subprocess.run(
+            [swift, "-print-target-info"], capture_output=True, text=True
+        )
+        if result.returncode == 0:
+            return json.loads(result.stdout)
+    except (OSError, ValueError):
+        pass
+    return None
+
+def _detect_sdk_path(env):
+    """Detect the default SDK path with xcrun"""
+    import subprocess
+
+    try:
+        result = subprocess.run(
+            ["xcrun", "--show-sdk-path"], capture_output=True, text=True
+        )
+        if result.returncode == 0:
+            return result.stdout.strip()
+    except OSError:
+        pass
+    return None
+
+
+# Toolchain probe results, keyed by compiler path, size and modification time
+_probe_cache = _SideCache("toolchain")
+
+# Probe results already looked up in this process, keyed by $SWIFT
+_probe_results = {}
+
+def _probe_swift_toolchain(env, swift):
+    """Return version, target and SDK information for a Swift compiler.
+
+    Results are cached next to the .sconsign database, so tool
+    initialization does not spawn processes until the compiler changes.
+    Set SWIFT_REPROBE to ignore the cached results.
+    """
+    path = env.WhereIs(swift) or swift
+    try:
+        st = os.stat(path)
+    except OSError:
+        return {}
+
+    key = f"{os.path.abspath(path)}:{st.st_size}:{st.st_mtime_ns}"
+    if env["PLATFORM"] == "darwin":
+        key += ":" + os.environ.get("DEVELOPER_DIR", "")
+
+    probe = None if env.get("SWIFT_REPROBE") else _probe_cache.get(env, key)
+    if probe is None:
+        target_info = _detect_swift_target_info(env, path)
+        probe = {
+            "version": _detect_swift_version(env, path),
+            "target_info": target_info,
+            "target_triple": (target_info or {}).get("target", {}).get("triple"),
+            "sdk_path": (
+                _detect_sdk_path(env) if env["PLATFORM"] == "darwin" else None
+            ),
+        }
+        _probe_cache.set(env, key, probe)
+    return probe
+
+class _SwiftProbeVariable:
+    """A construction variable computed from the toolchain probe.
+
+    The compiler is only probed when the variable is first substituted,
+    e.g. env.subst("$SWIFTVERSION").
+    """
+
+    def __init__(self, field):
+        self.field = field
+
+    def __call__(self, target, source, env, for_signature):
+        swift = env.subst("$SWIFT")
+        if swift not in _probe_results:
+            _probe_results[swift] = _probe_swift_toolchain(env, swift)
+        return _probe_results[swift].get(self.field) or ""
+
 
 def generate(env):
     """Add Builders and construction variables for Swift to an Environment."""
@@ -120,15 +1893,60 @@ def generate(env):
     env["_SWIFT_CXX_INTEROP_FLAG"] = (
         '${SWIFT_CXX_INTEROP and "-cxx-interoperability-mode=default" or ""}'
     )
-    env["_SWIFT_EMIT_CXX_HEADER_FLAG"] = (
-        '${SWIFT_EMIT_CXX_HEADER and "-emit-clang-header-path $_SWIFT_CXX_HEADER_NAME.abspath" or ""}'
-    )
+    env["_SWIFT_EMIT_CXX_HEADER_FLAG"] = _swift_cxx_header_flags
 
     # Module support
     env["SWIFTMODULENAME"] = ""
     env["SWIFTMODULESUFFIX"] = ".swiftmodule"
     env["SWIFTDOCSUFFIX"] = ".swiftdoc"
     env["SWIFTSOURCEINFOSUFFIX"] = ".swiftsourceinfo"
+    env["SWIFTABISUFFIX"] = ".abi.json"
+    env["SWIFTINTERFACESUFFIX"] = ".swiftinterface"
+    env["SWIFT_MODULE_OUTPUTS"] = ["swiftdoc", "swiftsourceinfo", "abi.json"]
+    env["_SWIFTMODULESIDEOUTPUTFLAGS"] = _swift_module_output_flags
+
+    # Modules built in this tree that the target imports and links
+    env["SWIFTMODULES"] = []
+    env["_SWIFTMODULESINCFLAGS"] = _swift_modules_inc_flags
+    env["_SWIFTMODULESLINKFLAGS"] = _swift_modules_link_flags
+
+    # Clang module cache shared by all Swift commands of the build
+    env["SWIFT_MODULE_CACHE_PATH"] = "#.swift-module-cache"
+    env["_SWIFT_MODULE_CACHE_FLAGS"] = _swift_module_cache_flags
+    env["SWIFTMODULECACHECOM"] = (
+        "$SWIFT -typecheck ${TARGET.abspath}.swift -I $SOURCE.dir.abspath $SWIFTFLAGS $SWIFTMODULECACHEFLAGS $_SWIFTCOMCOM"
+    )
+    env["SWIFTMODULECACHEFLAGS"] = SCons.Util.CLVar("")
+
+    # Bridging header imported by all Swift compile steps, optionally precompiled
+    env["SWIFT_BRIDGING_HEADER"] = ""
+    env["SWIFT_BRIDGING_PCH"] = False
+    env["SWIFT_BRIDGING_PCH_DIR"] = "#.swift-bridging-pch"
+    env["_SWIFT_BRIDGING_HEADER_FLAGS"] = _swift_bridging_header_flags(frontend=False)
+    env["_SWIFT_FRONTEND_BRIDGING_HEADER_FLAGS"] = _swift_bridging_header_flags(
+        frontend=True
+    )
+    env["SWIFTPCHCOM"] = (
+        "$SWIFT -emit-pch -o $TARGET.abspath $SOURCE.abspath $SWIFTFLAGS $SWIFTPCHFLAGS $_SWIFTCOMCOM"
+    )
+    env["SWIFTPCHFLAGS"] = SCons.Util.CLVar("")
+
+    # Explicit module builds: imported modules are built by their own nodes
+    env["SWIFT_EXPLICIT_MODULES"] = False
+    env["SWIFT_EXPLICIT_MODULES_DIR"] = "#.swift-explicit-modules"
+    env["_SWIFT_EXPLICIT_MODULE_FLAGS"] = _swift_explicit_module_flags(frontend=False)
+    env["_SWIFT_FRONTEND_EXPLICIT_MODULE_FLAGS"] = _swift_explicit_module_flags(
+        frontend=True
+    )
+    env["SWIFTSCANCOM"] = (
+        '$SWIFT -scan-dependencies ${SWIFTMODULENAME and "-module-name $SWIFTMODULENAME" or ""} $SOURCES.abspath $SWIFTFLAGS $_SWIFTSCANBUILDERFLAGS $_SWIFTCOMCOM'
+    )
+    env["SWIFTEMITPCMCOM"] = (
+        "$SWIFT -frontend $SWIFT_EXPLICIT_MODULE_ARGS -emit-pcm -module-name $SWIFT_EXPLICIT_MODULE_NAME -Xcc -fno-implicit-modules -Xcc -fno-implicit-module-maps $_SWIFT_EXPLICIT_PCM_DEPS -o $TARGET.abspath $SOURCE.abspath"
+    )
+    env["SWIFTCOMPILEINTERFACECOM"] = (
+        "$SWIFT -frontend $SWIFT_EXPLICIT_MODULE_ARGS -compile-module-from-interface -module-name $SWIFT_EXPLICIT_MODULE_NAME -disable-implicit-swift-modules -explicit-swift-module-map-file ${SOURCES[1].abspath} -Xcc -fno-implicit-modules -Xcc -fno-implicit-module-maps -o $TARGET.abspath $SOURCE.abspath"
+    )
 
     # Include paths (-I flag)
     env["INCPREFIX"] = "-I "
@@ -153,21 +1971,96 @@ def generate(env):
 
     # Common flags for both static and shared compilation
     env["_SWIFTCOMCOM"] = (
-        "$_SWIFTINCFLAGS $_SWIFTFRAMEWORKPATH $_SWIFTLIBFLAGS $_SWIFT_CXX_INTEROP_FLAG"
+        "$_SWIFTINCFLAGS $_SWIFTMODULESINCFLAGS $_SWIFTFRAMEWORKPATH $_SWIFTLIBFLAGS $_SWIFT_CXX_INTEROP_FLAG $_SWIFT_OPTIMIZATION_FLAG $_SWIFT_BRIDGING_HEADER_FLAGS $_SWIFT_EXPLICIT_MODULE_FLAGS $( $_SWIFT_MODULE_CACHE_FLAGS $)"
+    )
+
+    # Chrome trace of Swift actions
+    env["SWIFT_TRACE_FILE"] = ""
+
+    # Instrumented actions run their commands through _SwiftSpawn, which
+    # passes other commands to the SPAWN it wraps unchanged
+    if "SPAWN" in env and not isinstance(env["SPAWN"], _SwiftSpawn):
+        env["SPAWN"] = _SwiftSpawn(env["SPAWN"])
+
+    # Compiler statistics and type-checking hotspots
+    env["SWIFT_COMPILE_STATS"] = False
+    env["SWIFT_STATS_DIR"] = "${TARGET.dir.abspath}/${TARGET.filebase}.stats"
+    env["SWIFT_COMPILE_STATS_REPORT"] = "#swift-compile-stats.txt"
+    env["SWIFT_COMPILE_STATS_TOP"] = 20
+    env["_SWIFT_COMPILE_STATS_FLAGS"] = (
+        '${SWIFT_COMPILE_STATS and "-stats-output-dir $SWIFT_STATS_DIR '
+        '-Xfrontend -debug-time-function-bodies '
+        '-Xfrontend -debug-time-expression-type-checking" or ""}'
     )
+    env["_SWIFT_FRONTEND_COMPILE_STATS_FLAGS"] = (
+        '${SWIFT_COMPILE_STATS and "-stats-output-dir $SWIFT_STATS_DIR '
+        '-debug-time-function-bodies -debug-time-expression-type-checking" or ""}'
+    )
+
+    # Response files for long command lines
+    env["_SWIFTRESPONSEFILE"] = _SwiftResponseFile
+    env["SWIFT_RESPONSE_FILE"] = "${TARGET.abspath}.rsp"
+    env["SWIFT_RESPONSE_FILE_THRESHOLD"] = "$MAXLINELENGTH"
 
     # Library builder for Swift
     env["SWIFTLIBCOM"] = (
-        "$SWIFT -emit-library -o $TARGET $SOURCES $SWIFTLIBFLAGS $_SWIFTCOMCOM"
+        "$SWIFT -emit-library -o $TARGET $SOURCES $SWIFTFLAGS $SWIFTLIBFLAGS $_SWIFTMODULESLINKFLAGS $_SWIFTCOMCOM"
     )
     env["SWIFTLIBCOMSTR"] = env.get(
         "SWIFTLIBCOMSTR", SCons.Action.Action("$SWIFTLIBCOM", "$SWIFTLIBCOMSTR")
     )
     env["SWIFTLIBFLAGS"] = SCons.Util.CLVar("")
 
+    # Incremental compilation support
+    env["SWIFT_INCREMENTAL"] = False
+    env["SWIFT_OUTPUT_FILE_MAP"] = (
+        "${TARGET.dir.abspath}/${SWIFTMODULENAME}-output-file-map.json"
+    )
+    env["_SWIFT_INCREMENTAL_FLAGS"] = (
+        '${SWIFT_INCREMENTAL and not SWIFT_WMO and "-incremental" or ""}'
+    )
+
+    # Optimization and whole-module builds
+    env["SWIFT_OPTIMIZATION"] = ""
+    env["SWIFT_WMO"] = False
+    env["SWIFT_NUM_THREADS"] = _swift_num_threads
+    env["_SWIFT_OPTIMIZATION_FLAG"] = _swift_optimization_flag
+    env["_SWIFT_WMO_FLAGS"] = (
+        '${SWIFT_WMO and "-wmo $( -num-threads $SWIFT_NUM_THREADS $)" or ""}'
+    )
+
+    # Batch mode: the driver groups primary files into a few frontend jobs
+    env["SWIFT_BATCH_MODE"] = False
+    env["SWIFT_BATCH_SIZE"] = ""
+    env["SWIFT_BATCH_COUNT"] = ""
+    env["_SWIFT_BATCH_FLAGS"] = _swift_batch_flags
+    env["SWIFT_BATCH_VERBOSE"] = False
+    env["SWIFTBATCHSTR"] = "$_SWIFT_BATCH_REPORT"
+    env["_SWIFT_BATCH_REPORT"] = _swift_batch_report
+
+    # Makefile-style dependency files read back as implicit dependencies
+    env["SWIFT_EMIT_DEPENDENCIES"] = False
+    env["_SWIFT_EMIT_DEPENDENCIES_FLAG"] = (
+        '${SWIFT_EMIT_DEPENDENCIES and "-emit-dependencies" or ""}'
+    )
+
+    # Explicit output paths, so the module builds without changing directory
+    env["_SWIFTMODULEOUTPUTFLAGS"] = (
+        "-output-file-map $SWIFT_OUTPUT_FILE_MAP -emit-module-path $TARGET.abspath "
+        "$_SWIFTMODULESIDEOUTPUTFLAGS"
+    )
+
+    # Libraries linked from the objects of a module
+    env["SWIFT_THIN_ARCHIVE"] = False
+    env["SWIFT_THIN_ARFLAGS"] = "rcT"
+    env["SWIFTSHLIBCOM"] = (
+        "$SWIFT -emit-library -o $TARGET $SOURCES.abspath $SWIFTFLAGS $SWIFTSHLIBFLAGS $_SWIFTMODULESLINKFLAGS $_LIBDIRFLAGS $_LIBFLAGS"
+    )
+    env["SWIFTSHLIBFLAGS"] = SCons.Util.CLVar("")
+
     # Module builder for Swift
     env["SWIFTMODULECOM"] = (
-        "$SWIFT -c -emit-module -module-name $SWIFTMODULENAME $SOURCES.abspath $SWIFTMODULEFLAGS $_SWIFT_EMIT_CXX_HEADER_FLAG $_SWIFTCOMCOM"
+        "$SWIFT -c -emit-module -module-name $SWIFTMODULENAME $SOURCES.abspath $_SWIFTMODULEOUTPUTFLAGS $SWIFTFLAGS $SWIFTMODULEFLAGS $_SWIFT_WMO_FLAGS $_SWIFT_INCREMENTAL_FLAGS $( $_SWIFT_BATCH_FLAGS $) $_SWIFT_EMIT_DEPENDENCIES_FLAG $_SWIFT_COMPILE_STATS_FLAGS $_SWIFT_EMIT_CXX_HEADER_FLAG $_SWIFTCOMCOM"
     )
     env["SWIFTMODULECOMSTR"] = env.get(
         "SWIFTMODULECOMSTR",
@@ -175,8 +2068,41 @@ def generate(env):
     )
     env["SWIFTMODULEFLAGS"] = SCons.Util.CLVar("")
 
+    # Pipelined builds: the .swiftmodule and the objects as separate nodes
+    env["SWIFT_PIPELINED"] = False
+    env["SWIFTEMITMODULECOM"] = (
+        "$SWIFT -emit-module -module-name $SWIFTMODULENAME $SOURCES.abspath -emit-module-path $TARGET.abspath $_SWIFTMODULESIDEOUTPUTFLAGS $SWIFTFLAGS $SWIFTEMITMODULEFLAGS $SWIFTMODULEFLAGS $_SWIFT_EMIT_CXX_HEADER_FLAG $_SWIFTCOMCOM"
+    )
+    env["SWIFTEMITMODULEFLAGS"] = SCons.Util.CLVar(
+        "-experimental-skip-non-inlinable-function-bodies"
+    )
+    env["SWIFTMODULEOBJECTSCOM"] = (
+        "$SWIFT -c -module-name $SWIFTMODULENAME $SOURCES.abspath -output-file-map $SWIFT_OUTPUT_FILE_MAP $SWIFTFLAGS $SWIFTMODULEFLAGS $_SWIFT_WMO_FLAGS $_SWIFT_INCREMENTAL_FLAGS $( $_SWIFT_BATCH_FLAGS $) $_SWIFT_EMIT_DEPENDENCIES_FLAG $_SWIFT_COMPILE_STATS_FLAGS $_SWIFTCOMCOM"
+    )
+
+    # Parallel frontend jobs for SwiftModule
+    env["SWIFT_PARALLEL_FRONTEND"] = False
+    env["SWIFT_FRONTEND_BATCH_SIZE"] = 1
+    env["_swift_frontend_io"] = _swift_frontend_io
+    env["_SWIFT_SUPPLEMENTARY_OUTPUT_FILE_MAP"] = (
+        "${TARGET.dir.abspath}/${TARGET.filebase}-supplementary-output-file-map.json"
+    )
+    env["_SWIFTFRONTENDFLAGS"] = _swift_frontend_flags
+    env["_SWIFTFRONTENDCOMCOM"] = (
+        "$_SWIFTINCFLAGS $_SWIFTMODULESINCFLAGS $_SWIFTFRAMEWORKPATH $_SWIFT_CXX_INTEROP_FLAG $_SWIFT_OPTIMIZATION_FLAG $_SWIFT_FRONTEND_BRIDGING_HEADER_FLAGS $_SWIFT_FRONTEND_EXPLICIT_MODULE_FLAGS $( $_SWIFT_MODULE_CACHE_FLAGS $)"
+    )
+    env["SWIFTFRONTENDCOM"] = (
+        "$SWIFT -frontend -c $_swift_frontend_io -supplementary-output-file-map $_SWIFT_SUPPLEMENTARY_OUTPUT_FILE_MAP -module-name $SWIFTMODULENAME $_SWIFTFRONTENDFLAGS $SWIFTMODULEFLAGS $_SWIFT_FRONTEND_COMPILE_STATS_FLAGS $_SWIFTFRONTENDCOMCOM"
+    )
+    env["SWIFTMERGEMODULESCOM"] = (
+        "$SWIFT -frontend -merge-modules -emit-module $SOURCES.abspath -parse-as-library -sil-merge-partial-modules -disable-diagnostic-passes -disable-sil-perf-optzns -module-name $SWIFTMODULENAME -o $TARGET.abspath $_SWIFTMODULESIDEOUTPUTFLAGS $_SWIFTFRONTENDFLAGS $SWIFTMODULEFLAGS $_SWIFT_EMIT_CXX_HEADER_FLAG $_SWIFTFRONTENDCOMCOM"
+    )
+
     # Executable builder for Swift
-    env["SWIFTEXECOM"] = "$SWIFT -o $TARGET $SOURCES $SWIFTEXEFLAGS $_LIBDIRFLAGS $_LIBFLAGS $_SWIFTCOMCOM"
+    env["_SWIFTEXEOUTPUTFLAGS"] = (
+        '${SWIFT_EMIT_DEPENDENCIES and "-output-file-map $SWIFT_OUTPUT_FILE_MAP" or ""}'
+    )
+    env["SWIFTEXECOM"] = "$SWIFT -o $TARGET $SOURCES.abspath $_SWIFTEXEOUTPUTFLAGS $SWIFTFLAGS $SWIFTEXEFLAGS $( $_SWIFT_BATCH_FLAGS $) $_SWIFT_EMIT_DEPENDENCIES_FLAG $_SWIFT_COMPILE_STATS_FLAGS $_SWIFTMODULESLINKFLAGS $_LIBDIRFLAGS $_LIBFLAGS $_SWIFTCOMCOM"
     env["SWIFTEXECOMSTR"] = env.get(
         "SWIFTEXECOMSTR", SCons.Action.Action("$SWIFTEXECOM", "$SWIFTEXECOMSTR")
     )
@@ -186,54 +2112,254 @@ def generate(env):
 
     # Swift Module Builder
     swift_module_builder = SCons.Builder.Builder(
-        action=SCons.Action.Action("$SWIFTMODULECOM", "$SWIFTMODULECOMSTR"),
+        action=_swift_instrumented_actions(
+            SCons.Action.Action(_swift_output_file_map, None),
+            SCons.Action.Action(
+                _swift_batch_noop, strfunction=_swift_batch_strfunction
+            ),
+            _swift_command_action("SWIFTMODULECOM"),
+            SCons.Action.Action(_swift_record_dependencies, None),
+            SCons.Action.Action(_swift_update_cxx_header, None),
+        ),
+        suffix="$SWIFTMODULESUFFIX",
+        src_suffix=SwiftSuffixes,
+        emitter=[
+            _swift_cxx_header_emitter,
+            _swift_obj_emitter,
+            _swift_emitter,
+            _swift_incremental_emitter,
+            _swift_dependencies_emitter,
+            _swift_response_file_emitter,
+            _swift_instrument_emitter,
+            _swift_module_cache_emitter,
+            _swift_compilation_db_emitter("SWIFTMODULECOM"),
+            _swift_modules_emitter(link=False),
+            _swift_bridging_header_emitter,
+            _swift_explicit_modules_emitter("SWIFTMODULEFLAGS"),
+        ],
+        source_scanner=SwiftScanner,
+        target_scanner=SwiftObjectDependencyScanner,
+        single_source=0,
+    )
+    env["BUILDERS"]["_SwiftModule"] = swift_module_builder
+
+    # Emits only the .swiftmodule of a pipelined module
+    swift_emit_module_builder = SCons.Builder.Builder(
+        action=_swift_instrumented_actions(
+            _swift_command_action("SWIFTEMITMODULECOM"),
+            SCons.Action.Action(_swift_update_cxx_header, None),
+        ),
         suffix="$SWIFTMODULESUFFIX",
         src_suffix=SwiftSuffixes,
-        emitter=[_swift_cxx_header_emitter, _swift_obj_emitter, _swift_emitter],
-        chdir=True,
+        emitter=[
+            _swift_cxx_header_emitter,
+            _swift_emitter,
+            _swift_response_file_emitter,
+            _swift_instrument_emitter,
+            _swift_module_cache_emitter,
+            _swift_modules_emitter(link=False),
+            _swift_bridging_header_emitter,
+            _swift_explicit_modules_emitter("SWIFTMODULEFLAGS"),
+        ],
+        source_scanner=SwiftScanner,
+        single_source=0,
+    )
+    env["BUILDERS"]["_SwiftEmitModule"] = swift_emit_module_builder
+
+    # Compiles the objects of a pipelined module
+    swift_module_objects_builder = SCons.Builder.Builder(
+        action=_swift_instrumented_actions(
+            SCons.Action.Action(_swift_output_file_map, None),
+            SCons.Action.Action(
+                _swift_batch_noop, strfunction=_swift_batch_strfunction
+            ),
+            _swift_command_action("SWIFTMODULEOBJECTSCOM"),
+            SCons.Action.Action(_swift_record_dependencies, None),
+        ),
+        src_suffix=SwiftSuffixes,
+        emitter=[
+            _swift_incremental_emitter,
+            _swift_dependencies_emitter,
+            _swift_response_file_emitter,
+            _swift_instrument_emitter,
+            _swift_module_cache_emitter,
+            _swift_modules_emitter(link=False),
+            _swift_bridging_header_emitter,
+            _swift_explicit_modules_emitter("SWIFTMODULEFLAGS"),
+        ],
+        source_scanner=SwiftScanner,
+        target_scanner=SwiftObjectDependencyScanner,
+        single_source=0,
+    )
+    env["BUILDERS"]["_SwiftModuleObjects"] = swift_module_objects_builder
+
+    # Swift frontend job compiling a batch of primary files of a module
+    swift_frontend_builder = SCons.Builder.Builder(
+        action=_swift_instrumented_actions(
+            SCons.Action.Action(_swift_supplementary_output_file_map, None),
+            _swift_command_action("SWIFTFRONTENDCOM"),
+            SCons.Action.Action(_swift_record_dependencies, None),
+        ),
+        src_suffix=SwiftSuffixes,
+        source_scanner=SwiftScanner,
+        emitter=[
+            _swift_instrument_emitter,
+            _swift_module_cache_emitter,
+            _swift_modules_emitter(link=False),
+            _swift_bridging_header_emitter,
+            _swift_explicit_modules_emitter("SWIFTMODULEFLAGS"),
+        ],
+        target_scanner=SwiftObjectDependencyScanner,
         single_source=0,
     )
-    env["BUILDERS"]["SwiftModule"] = swift_module_builder
+    env["BUILDERS"]["_SwiftFrontend"] = swift_frontend_builder
+
+    # Merges the partial modules of the frontend jobs into the module
+    swift_merge_modules_builder = SCons.Builder.Builder(
+        action=_swift_instrumented_actions(
+            _swift_command_action("SWIFTMERGEMODULESCOM"),
+            SCons.Action.Action(_swift_update_cxx_header, None),
+        ),
+        suffix="$SWIFTMODULESUFFIX",
+        emitter=[
+            _swift_cxx_header_emitter,
+            _swift_emitter,
+            _swift_instrument_emitter,
+            _swift_module_cache_emitter,
+            _swift_modules_emitter(link=False),
+        ],
+        single_source=0,
+    )
+    env["BUILDERS"]["_SwiftMergeModules"] = swift_merge_modules_builder
+
+    env.AddMethod(SwiftModule, "SwiftModule")
+    env.AddMethod(SwiftInterfaceDecider, "SwiftInterfaceDecider")
+
+    # Compilation database of the Swift builders
+    env["SWIFTCOMPILATIONDBCOMSTR"] = "Building Swift compilation database $TARGET"
+    swift_compilation_db_builder = SCons.Builder.Builder(
+        action=SCons.Action.Action(
+            _swift_write_compilation_db, "$SWIFTCOMPILATIONDBCOMSTR"
+        ),
+    )
+    env["BUILDERS"]["_SwiftCompilationDatabase"] = swift_compilation_db_builder
+    env.AddMethod(SwiftCompilationDatabase, "SwiftCompilationDatabase")
 
     # Swift Library Builder
     swift_lib_builder = SCons.Builder.Builder(
-        action=SCons.Action.Action("$SWIFTLIBCOM", "$SWIFTLIBCOMSTR"),
+        action=_swift_instrumented_actions(_swift_command_action("SWIFTLIBCOM")),
         suffix="$SHLIBSUFFIX",
         src_suffix=SwiftSuffixes,
+        emitter=[
+            _swift_response_file_emitter,
+            _swift_instrument_emitter,
+            _swift_module_cache_emitter,
+            _swift_compilation_db_emitter("SWIFTLIBCOM"),
+            _swift_modules_emitter(link=True),
+            _swift_bridging_header_emitter,
+            _swift_explicit_modules_emitter("SWIFTLIBFLAGS"),
+        ],
+        source_scanner=SwiftScanner,
         single_source=0,
     )
     env["BUILDERS"]["SwiftLibrary"] = swift_lib_builder
 
+    # Shared library linked from the objects of a Swift module
+    swift_shared_link_builder = SCons.Builder.Builder(
+        action=_swift_instrumented_actions(_swift_command_action("SWIFTSHLIBCOM")),
+        prefix="$SHLIBPREFIX",
+        suffix="$SHLIBSUFFIX",
+        emitter=[
+            _swift_response_file_emitter,
+            _swift_instrument_emitter,
+            _swift_module_cache_emitter,
+            _swift_modules_emitter(link=True),
+        ],
+        single_source=0,
+    )
+    env["BUILDERS"]["_SwiftSharedLink"] = swift_shared_link_builder
+    env.AddMethod(SwiftStaticLibrary, "SwiftStaticLibrary")
+    env.AddMethod(SwiftSharedLibrary, "SwiftSharedLibrary")
+
+    # Builds the Clang modules of a modulemap into the module cache
+    swift_module_cache_builder = SCons.Builder.Builder(
+        action=_swift_instrumented_actions(
+            SCons.Action.Action(_swift_module_cache_imports, None),
+            _swift_command_action("SWIFTMODULECACHECOM"),
+            SCons.Action.Action(_swift_module_cache_stamp, None),
+        ),
+        emitter=[_swift_response_file_emitter, _swift_instrument_emitter],
+        source_scanner=ModuleMapScanner,
+    )
+    env["BUILDERS"]["_SwiftModuleCacheWarm"] = swift_module_cache_builder
+    env.AddMethod(SwiftModuleCache, "SwiftModuleCache")
+
+    # Precompiled bridging headers
+    env["BUILDERS"]["_SwiftBridgingPCH"] = SCons.Builder.Builder(
+        action=_swift_instrumented_actions(
+            _swift_command_action("SWIFTPCHCOM")
+        ),
+        emitter=[_swift_response_file_emitter, _swift_instrument_emitter],
+        source_scanner=SCons.Tool.CScanner,
+    )
+
+    # Explicit module nodes created from -scan-dependencies results
+    env["BUILDERS"]["_SwiftEmitPCM"] = SCons.Builder.Builder(
+        action=_swift_instrumented_actions(_swift_command_action("SWIFTEMITPCMCOM")),
+        emitter=[_swift_response_file_emitter, _swift_instrument_emitter],
+    )
+    env["BUILDERS"]["_SwiftCompileInterface"] = SCons.Builder.Builder(
+        action=_swift_instrumented_actions(
+            _swift_command_action("SWIFTCOMPILEINTERFACECOM")
+        ),
+        emitter=[_swift_response_file_emitter, _swift_instrument_emitter],
+    )
+    env["BUILDERS"]["_SwiftExplicitModuleMap"] = SCons.Builder.Builder(
+        action=SCons.Action.Action(_swift_write_explicit_module_map, None),
+    )
+
     # Swift Program Builder
     swift_exe_builder = SCons.Builder.Builder(
-        action=SCons.Action.Action("$SWIFTEXECOM", "$SWIFTEXECOMSTR"),
+        action=_swift_instrumented_actions(
+            SCons.Action.Action(_swift_output_file_map, None),
+            SCons.Action.Action(
+                _swift_batch_noop, strfunction=_swift_batch_strfunction
+            ),
+            _swift_command_action("SWIFTEXECOM"),
+            SCons.Action.Action(_swift_record_dependencies, None),
+        ),
         suffix="$PROGSUFFIX",
         src_suffix=SwiftSuffixes,
+        emitter=[
+            _swift_dependencies_emitter,
+            _swift_response_file_emitter,
+            _swift_instrument_emitter,
+            _swift_module_cache_emitter,
+            _swift_compilation_db_emitter("SWIFTEXECOM"),
+            _swift_modules_emitter(link=True),
+            _swift_bridging_header_emitter,
+            _swift_explicit_modules_emitter("SWIFTEXEFLAGS"),
+        ],
+        source_scanner=SwiftScanner,
+        target_scanner=SwiftProgramDependencyScanner,
+        SWIFT_OUTPUT_FILE_MAP="${TARGET.dir.abspath}/${TARGET.name}-output-file-map.json",
         single_source=0,
     )
     env["BUILDERS"]["SwiftProgram"] = swift_exe_builder
 
+    # Toolchain details are probed on first substitution only, so builds that
+    # never expand a Swift command line do not run the compiler
+    env["SWIFT_TARGET_TRIPLE"] = _SwiftProbeVariable("target_triple")
+
     # Set up platform-specific flags
     if env["PLATFORM"] == "darwin":
         # macOS/iOS specific flags
         env.AppendUnique(SWIFTFLAGS=["-sdk", "$SDKROOT"])
         if not env.get("SDKROOT"):
-            import subprocess
-
-            try:
-                result = subprocess.run(
-                    ["xcrun", "--show-sdk-path"], capture_output=True, text=True
-                )
-                if result.returncode == 0:
-                    env["SDKROOT"] = result.stdout.strip()
-            except:
-                pass
+            env["SDKROOT"] = _SwiftProbeVariable("sdk_path")
 
     # Detect Swift version and set version-specific flags
-    version = _detect_swift_version(env, env["SWIFT"])
-    if version:
-        env["SWIFTVERSION"] = version
-        # Could add version-specific flags here
+    env["SWIFTVERSION"] = _SwiftProbeVariable("version")
 
 
 def exists(env):
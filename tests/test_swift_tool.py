@@ -0,0 +1,321 @@
+"""Smoke tests of the Swift tool driven by SCons with utils/fake_swiftc.py.
+
+Each test builds a small project (a module, a static library made from it
+and a program importing it) in a temporary directory, checks the outputs,
+that a second run is up to date, and that editing a source rebuilds it.
+Focused cases cover the C++ header, the interface decider, compiler
+dependency files, the compilation database and SWIFTMODULES linking.
+
+    python -m pytest tests
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TOOLPATH = os.path.join(REPO, "sconscontrib", "SCons", "Tool")
+FAKE_SWIFTC = os.path.join(REPO, "utils", "fake_swiftc.py")
+
+SCONSTRUCT = """
+env = Environment(tools=["default", "swift"], toolpath=[{toolpath!r}], SWIFT={swift!r})
+env.Replace(**{variables!r})
+env["ENV"].update({fake_env!r})
+"""
+
+PROJECT = """
+module = env.SwiftModule("Geometry/Geometry", Glob("Geometry/*.swift"),
+                         SWIFTMODULENAME="Geometry")
+lib = env.SwiftStaticLibrary("Geometry/Geometry", module)
+env.SwiftProgram("app", ["main.swift"], SWIFTMODULES=lib)
+"""
+
+# Shapes imports Geometry and judges it by its .swiftinterface
+DECIDER_PROJECT = """
+env.Append(SWIFT_MODULE_OUTPUTS=["swiftinterface"])
+geometry = env.SwiftModule("Geometry/Geometry", Glob("Geometry/*.swift"),
+                           SWIFTMODULENAME="Geometry")
+env.SwiftInterfaceDecider()
+env.SwiftModule("Shapes/Shapes", ["Shapes/square.swift"],
+                SWIFTMODULENAME="Shapes", SWIFTMODULES=geometry)
+"""
+
+COMPILATION_DB_PROJECT = PROJECT + """
+env.SwiftCompilationDatabase()
+"""
+
+# The module built into a directory that does not exist yet
+BUILD_DIR_PROJECT = """
+env.SwiftModule("build/Geometry/Geometry", Glob("Geometry/*.swift"),
+                SWIFTMODULENAME="Geometry")
+"""
+
+# Geometry linked through its library, Units through its objects
+MIXED_PROJECT = """
+module = env.SwiftModule("Geometry/Geometry", Glob("Geometry/*.swift"),
+                         SWIFTMODULENAME="Geometry")
+lib = env.SwiftStaticLibrary("Geometry/Geometry", module)
+units = env.SwiftModule("Units/Units", ["Units/meters.swift"],
+                        SWIFTMODULENAME="Units")
+env.SwiftProgram("app", ["main.swift"], SWIFTMODULES=[lib, units])
+"""
+
+SOURCES = {
+    "Geometry/point.swift": (
+        "public struct Point {\n"
+        "    public var x: Int\n"
+        "    public init(x: Int) { self.x = x }\n"
+        "}\n"
+    ),
+    "Geometry/distance.swift": (
+        "public func distance(_ a: Point, _ b: Point) -> Int {\n"
+        "    return b.x - a.x\n"
+        "}\n"
+    ),
+    "main.swift": "import Geometry\n\nprint(distance(Point(x: 1), Point(x: 3)))\n",
+}
+
+
+def scons_command():
+    """Return the command running SCons, or None if it is not available"""
+    if shutil.which("scons"):
+        return [shutil.which("scons")]
+    try:
+        import SCons  # noqa: F401
+    except ImportError:
+        return None
+    return [sys.executable, "-m", "SCons"]
+
+
+@unittest.skipIf(scons_command() is None, "SCons is not installed")
+class SwiftToolSmokeTest(unittest.TestCase):
+    """Build the project with the fake compiler in each compilation mode"""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix="swift-tool-test-")
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+
+    def write_project(self, fake_env=None, project=PROJECT, **variables):
+        for path, text in SOURCES.items():
+            self.write(path, text)
+        self.write(
+            "SConstruct",
+            SCONSTRUCT.format(
+                toolpath=TOOLPATH,
+                swift=FAKE_SWIFTC,
+                variables=variables,
+                fake_env=fake_env or {},
+            )
+            + project,
+        )
+
+    def write(self, path, text):
+        path = os.path.join(self.root, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(text)
+
+    def scons(self, *args):
+        return subprocess.run(
+            scons_command() + ["-Q"] + list(args),
+            cwd=self.root,
+            capture_output=True,
+            text=True,
+        )
+
+    def assertBuilds(self, *args):
+        result = self.scons(*args)
+        self.assertEqual(result.returncode, 0, result.stdout + result.stderr)
+        return result.stdout
+
+    def assertUpToDate(self):
+        # scons -q exits with 1 if any target is out of date
+        result = self.scons("-q")
+        self.assertEqual(result.returncode, 0, result.stdout + result.stderr)
+
+    def assertOutdated(self):
+        self.assertEqual(self.scons("-q").returncode, 1)
+
+    def assertExists(self, *paths):
+        for path in paths:
+            self.assertTrue(
+                os.path.exists(os.path.join(self.root, path)), f"{path} missing"
+            )
+
+    def check_build(self, jobs=1, fake_env=None, **variables):
+        """Build, check the outputs and the null build, then edit a body"""
+        self.write_project(fake_env, **variables)
+        output = self.assertBuilds(f"-j{jobs}")
+        self.assertExists(
+            "Geometry/Geometry.swiftmodule",
+            "Geometry/Geometry.swiftdoc",
+            "Geometry/point.o",
+            "Geometry/distance.o",
+            "Geometry/libGeometry.a",
+            "app",
+        )
+        self.assertUpToDate()
+
+        self.edit_body()
+        self.assertOutdated()
+        self.assertBuilds(f"-j{jobs}")
+        self.assertUpToDate()
+        return output
+
+    def test_default(self):
+        self.check_build()
+
+    def test_incremental(self):
+        self.check_build(SWIFT_INCREMENTAL=True)
+        self.assertExists("Geometry/point.swiftdeps")
+
+    def test_parallel_frontend(self):
+        output = self.check_build(jobs=2, SWIFT_PARALLEL_FRONTEND=True)
+        self.assertEqual(output.count("-primary-file"), 2)
+
+    def test_pipelined(self):
+        self.check_build(jobs=2, SWIFT_PIPELINED=True)
+
+    def test_wmo(self):
+        output = self.check_build(SWIFT_WMO=True, SWIFT_OPTIMIZATION="speed")
+        self.assertIn("-wmo", output)
+
+    def test_batch_mode(self):
+        output = self.check_build(jobs=2, SWIFT_BATCH_MODE=True)
+        self.assertIn("-enable-batch-mode", output)
+
+    def test_response_files(self):
+        output = self.check_build(SWIFT_RESPONSE_FILE_THRESHOLD=1)
+        self.assertIn("@", output)
+        self.assertExists("Geometry/Geometry.swiftmodule.rsp", "app.rsp")
+
+    def test_response_files_dry_run(self):
+        # scons -n prints the commands without writing the response files,
+        # also when their directory does not exist yet
+        self.write_project(project=BUILD_DIR_PROJECT, SWIFT_RESPONSE_FILE_THRESHOLD=1)
+        output = self.assertBuilds("-n")
+        self.assertIn("Geometry.swiftmodule.rsp", output)
+        self.assertFalse(os.path.exists(os.path.join(self.root, "build")))
+        self.assertBuilds()
+        self.assertExists("build/Geometry/Geometry.swiftmodule.rsp")
+        self.assertUpToDate()
+
+    def test_emit_dependencies(self):
+        # The .d files name a header besides the sources, which must not make
+        # the second run rebuild
+        self.write("include/shim.h", "#pragma once\n")
+        header = os.path.join(self.root, "include", "shim.h")
+        self.check_build(
+            jobs=2,
+            fake_env={"FAKE_SWIFTC_EXTRA_DEPS": header},
+            SWIFT_EMIT_DEPENDENCIES=True,
+        )
+        self.assertExists("Geometry/point.d", "app-main.d")
+
+        self.write("include/shim.h", "#pragma once\n// edited\n")
+        self.assertOutdated()
+        self.assertBuilds()
+        self.assertUpToDate()
+
+    def test_mixed_modules(self):
+        self.write(
+            "Units/meters.swift",
+            "public func meters(_ x: Int) -> Int {\n    return x\n}\n",
+        )
+        self.write_project(project=MIXED_PROJECT)
+        output = self.assertBuilds()
+        link = next(line for line in output.splitlines() if " -o app " in line)
+        self.assertIn("libGeometry.a", link)
+        self.assertNotIn("point.o", link)
+        self.assertIn("meters.o", link)
+        self.assertUpToDate()
+
+    def edit_body(self):
+        """Change a function body of Geometry without touching its interface"""
+        self.write(
+            "Geometry/distance.swift",
+            SOURCES["Geometry/distance.swift"].replace("b.x - a.x", "a.x - b.x"),
+        )
+
+    def edit_interface(self):
+        """Add a public declaration to Geometry"""
+        self.write(
+            "Geometry/distance.swift",
+            SOURCES["Geometry/distance.swift"] + "public func origin() -> Int { 0 }\n",
+        )
+
+    def test_cxx_header_kept_when_unchanged(self):
+        self.write_project(SWIFT_CXX_INTEROP=True, SWIFT_EMIT_CXX_HEADER=True)
+        self.assertBuilds()
+        header = os.path.join(self.root, "Geometry", "Geometry-Swift.h")
+        mtime = os.stat(header).st_mtime_ns
+
+        self.edit_body()
+        self.assertBuilds()
+        self.assertEqual(os.stat(header).st_mtime_ns, mtime)
+        self.assertFalse(os.path.exists(header + ".tmp"))
+        self.assertUpToDate()
+
+        self.edit_interface()
+        self.assertBuilds()
+        with open(header) as f:
+            self.assertIn("origin", f.read())
+
+    def test_interface_decider(self):
+        self.write(
+            "Shapes/square.swift",
+            "import Geometry\n\npublic func side() -> Int {\n"
+            "    return distance(Point(x: 0), Point(x: 2))\n}\n",
+        )
+        self.write_project(project=DECIDER_PROJECT)
+        self.assertBuilds()
+        self.assertExists("Geometry/Geometry.swiftinterface")
+        self.assertUpToDate()
+
+        # Body edits rebuild Geometry only
+        self.edit_body()
+        output = self.assertBuilds()
+        self.assertIn("-module-name Geometry", output)
+        self.assertNotIn("-module-name Shapes", output)
+        self.assertUpToDate()
+
+        # Interface edits rebuild its dependents
+        self.edit_interface()
+        self.assertIn("-module-name Shapes", self.assertBuilds())
+        self.assertUpToDate()
+
+    def test_interface_decider_optimized(self):
+        # Optimized modules carry bodies, so the decider must not skip them
+        self.write(
+            "Shapes/square.swift",
+            "import Geometry\n\npublic func side() -> Int {\n"
+            "    return distance(Point(x: 0), Point(x: 2))\n}\n",
+        )
+        self.write_project(project=DECIDER_PROJECT, SWIFT_OPTIMIZATION="speed")
+        self.assertBuilds()
+        self.edit_body()
+        self.assertIn("-module-name Shapes", self.assertBuilds())
+        self.assertUpToDate()
+
+    def test_compilation_database(self):
+        self.write_project(project=COMPILATION_DB_PROJECT)
+        self.assertBuilds()
+        with open(os.path.join(self.root, "compile_commands.json")) as f:
+            entries = json.load(f)
+        files = {os.path.basename(entry["file"]) for entry in entries}
+        self.assertEqual(files, {"point.swift", "distance.swift", "main.swift"})
+        self.assertUpToDate()
+
+        # Source edits leave the commands, and so the database, unchanged
+        self.edit_body()
+        output = self.assertBuilds()
+        self.assertNotIn("compilation database", output)
+        self.assertUpToDate()
+
+
+if __name__ == "__main__":
+    unittest.main()
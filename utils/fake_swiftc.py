@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+A stand-in for swiftc that writes the outputs a command asks for without
+compiling anything, so the Swift tool's builders can be exercised and
+benchmarked on machines without a Swift toolchain.
+
+Select it with the SWIFT construction variable:
+
+    env["SWIFT"] = File("#utils/fake_swiftc.py").abspath
+
+It understands the flags the tool emits: -c, -emit-module, -emit-library,
+-emit-pch, -emit-clang-header-path and the other -emit-*-path outputs, -o,
+-output-file-map, -supplementary-output-file-map, -emit-dependencies,
+frontend -primary-file jobs, -j/-num-threads and @response files. Outputs
+are derived from the inputs only, so builds are deterministic: objects
+change with their source, modules, side outputs and C++ headers only with
+the public declarations of the module, except optimized modules, which
+change with every source.
+
+Cost is simulated with these environment variables (set them in
+env["ENV"]) or the matching --fake-* options:
+
+    FAKE_SWIFTC_STARTUP    seconds per process (--fake-startup)
+    FAKE_SWIFTC_LATENCY    seconds per compiled source (--fake-latency),
+                           spread over -j or -num-threads workers
+    FAKE_SWIFTC_MEMORY_MB  megabytes kept allocated while working
+                           (--fake-memory-mb)
+
+FAKE_SWIFTC_EXTRA_DEPS lists further files, separated by os.pathsep, that
+every .d file names after the sources, like the headers and modulemaps a
+real swiftc reports.
+"""
+
+import hashlib
+import json
+import os
+import re
+import shlex
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Declarations that make up the public interface of a module
+PublicDeclRE = re.compile(r"^[ \t]*(?:@\w+[ \t]+)*(?:public|open)[ \t]+[^{\n]*", re.M)
+
+
+def expand_response_files(args):
+    """Replace @file arguments with the arguments in the file"""
+    result = []
+    for arg in args:
+        if arg.startswith("@") and os.path.isfile(arg[1:]):
+            with open(arg[1:]) as f:
+                result.extend(expand_response_files(shlex.split(f.read())))
+        else:
+            result.append(arg)
+    return result
+
+
+def fake_options(args):
+    """Split the --fake-* options from the compiler arguments"""
+    options = {
+        "startup": float(os.environ.get("FAKE_SWIFTC_STARTUP", 0)),
+        "latency": float(os.environ.get("FAKE_SWIFTC_LATENCY", 0)),
+        "memory_mb": float(os.environ.get("FAKE_SWIFTC_MEMORY_MB", 0)),
+    }
+    rest = []
+    for arg in args:
+        m = re.match(r"--fake-(startup|latency|memory-mb)=(.*)$", arg)
+        if m:
+            options[m.group(1).replace("-", "_")] = float(m.group(2))
+        else:
+            rest.append(arg)
+    return options, rest
+
+
+def read(path):
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except OSError:
+        return b""
+
+
+def write(path, data):
+    """Write data to path, creating its directory"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "wb" if isinstance(data, bytes) else "w") as f:
+        f.write(data)
+
+
+def digest(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part if isinstance(part, bytes) else part.encode())
+    return h.hexdigest()
+
+
+def public_interface(sources):
+    """Return the public declarations of sources, one per line"""
+    decls = []
+    for source in sources:
+        text = read(source).decode(errors="replace")
+        decls.extend(m.group(0).strip() for m in PublicDeclRE.finditer(text))
+    return "\n".join(decls) + "\n"
+
+
+class Invocation:
+    """The parsed arguments of one compiler invocation"""
+
+    def __init__(self, args):
+        self.args = args
+        self.outputs = []
+        self.path_outputs = []
+        self.output_file_maps = []
+        self.sources = []
+        self.primaries = []
+        self.jobs = 1
+        self.module_name = "main"
+        i = 0
+        while i < len(args):
+            arg = args[i]
+            value = args[i + 1] if i + 1 < len(args) else None
+            if arg == "-o":
+                self.outputs.append(value)
+                i += 1
+            elif arg in ("-output-file-map", "-supplementary-output-file-map"):
+                with open(value) as f:
+                    self.output_file_maps.append(json.load(f))
+                i += 1
+            elif arg == "-emit-module-path" or re.match(r"-emit-.*-path$", arg):
+                self.path_outputs.append((arg, value))
+                i += 1
+            elif arg == "-module-name":
+                self.module_name = value
+                i += 1
+            elif arg in ("-j", "-num-threads"):
+                self.jobs = max(1, int(value))
+                i += 1
+            elif re.match(r"-j\d+$", arg):
+                self.jobs = int(arg[2:])
+            elif arg == "-primary-file":
+                self.primaries.append(value)
+                self.sources.append(value)
+                i += 1
+            elif arg.endswith(".swift") and not arg.startswith("-"):
+                self.sources.append(arg)
+            i += 1
+        self.interface = public_interface(self.sources)
+
+    def has(self, flag):
+        return flag in self.args
+
+    def object_data(self, source):
+        return f"fake object {os.path.basename(source)} {digest(read(source))}\n"
+
+    def module_data(self, kind):
+        data = f"fake {kind} {self.module_name}\n{self.interface}"
+        optimized = {"-O", "-Osize", "-Ounchecked"} & set(self.args)
+        if kind in ("module", "swiftmodule") and optimized:
+            # Optimized modules serialize function bodies for cross-module
+            # optimization, so they change with any source edit
+            data += digest(*[read(s) for s in self.sources]) + "\n"
+        return data
+
+    def clang_header(self):
+        guard = re.sub(r"\W", "_", self.module_name).upper() + "_SWIFT_H"
+        lines = [f"// Generated by fake_swiftc for module {self.module_name}"]
+        lines += [f"#ifndef {guard}", f"#define {guard}"]
+        lines += [f"// {decl}" for decl in self.interface.splitlines()]
+        lines += [f"#endif // {guard}", ""]
+        return "\n".join(lines)
+
+    def dependency_data(self, target):
+        # swiftc separates targets and prerequisites with " : "
+        extra = os.environ.get("FAKE_SWIFTC_EXTRA_DEPS", "").split(os.pathsep)
+        deps = self.sources + [path for path in extra if path]
+        return f"{target} : " + " ".join(deps) + "\n"
+
+    def output_data(self, kind, path, source=None):
+        """Return the contents of an output of the given kind"""
+        if kind == "object":
+            return self.object_data(source or path)
+        if kind == "dependencies":
+            return self.dependency_data(path)
+        if kind in ("swiftmodule", "swiftdoc", "swiftsourceinfo", "abi-baseline-json"):
+            return self.module_data(kind)
+        return f"fake {kind}\n"
+
+    def path_output_data(self, flag, path):
+        if flag == "-emit-clang-header-path":
+            return self.clang_header()
+        if flag == "-emit-dependencies-path":
+            return self.dependency_data(path)
+        return self.module_data(flag[len("-emit-") : -len("-path")])
+
+
+def print_timings(invocation):
+    """Print -debug-time-function-bodies lines for the compiled functions"""
+    for source in invocation.primaries or invocation.sources:
+        text = read(source).decode(errors="replace")
+        for m in re.finditer(r"\bfunc\s+(\w+)", text):
+            line = text.count("\n", 0, m.start()) + 1
+            column = m.start() - text.rfind("\n", 0, m.start())
+            print(
+                f"0.10ms\t{os.path.abspath(source)}:{line}:{column}\t"
+                f"global function {m.group(1)}()",
+                file=sys.stderr,
+            )
+
+
+def simulate_work(options, count, jobs):
+    """Spend the configured time and memory on count compiled sources"""
+    ballast = None
+    if options["memory_mb"]:
+        ballast = bytearray(int(options["memory_mb"] * 1024 * 1024))
+        for i in range(0, len(ballast), 4096):
+            ballast[i] = 1
+    time.sleep(options["startup"])
+    if options["latency"] and count:
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            list(pool.map(lambda _: time.sleep(options["latency"]), range(count)))
+    del ballast
+
+
+def main(argv):
+    options, args = fake_options(expand_response_files(argv))
+
+    if "--version" in args or "-version" in args:
+        print("Swift version 0.0 (fake_swiftc)")
+        print("Target: x86_64-unknown-linux-gnu")
+        return 0
+    if "-print-target-info" in args:
+        print(json.dumps({"target": {"triple": "x86_64-unknown-linux-gnu"}}))
+        return 0
+
+    invocation = Invocation(args)
+    if invocation.has("-scan-dependencies"):
+        name = invocation.module_name
+        print(
+            json.dumps(
+                {
+                    "mainModuleName": name,
+                    "modules": [
+                        {"swift": name},
+                        {
+                            "modulePath": f"{name}.swiftmodule",
+                            "sourceFiles": invocation.sources,
+                            "directDependencies": [],
+                            "details": {"swift": {}},
+                        },
+                    ],
+                }
+            )
+        )
+        return 0
+
+    compiled = invocation.primaries or (
+        invocation.sources if invocation.has("-c") else []
+    )
+    simulate_work(options, len(compiled), invocation.jobs)
+
+    written = set()
+    for output_file_map in invocation.output_file_maps:
+        for source, entries in output_file_map.items():
+            for kind, path in entries.items():
+                write(path, invocation.output_data(kind, path, source or None))
+                written.add(path)
+
+    for flag, path in invocation.path_outputs:
+        write(path, invocation.path_output_data(flag, path))
+        written.add(path)
+
+    if invocation.has("-frontend") and invocation.primaries:
+        # One -o per primary file, in order
+        for source, path in zip(invocation.primaries, invocation.outputs):
+            write(path, invocation.object_data(source))
+    elif invocation.has("-c") and not invocation.has("-emit-library"):
+        objects = [p for p in written if p.endswith(".o")]
+        if not objects and invocation.outputs and len(compiled) == 1:
+            write(invocation.outputs[0], invocation.object_data(compiled[0]))
+        elif not objects:
+            for source in compiled:
+                write(
+                    os.path.splitext(os.path.basename(source))[0] + ".o",
+                    invocation.object_data(source),
+                )
+    else:
+        inputs = [a for a in args if os.path.isfile(a) and not a.startswith("-")]
+        for path in invocation.outputs:
+            if path in written:
+                continue
+            if invocation.has("-emit-module") and invocation.sources:
+                data = invocation.module_data("swiftmodule")
+            else:
+                data = f"fake output {digest(*[read(i) for i in inputs])}\n"
+            write(path, data)
+
+    if invocation.has("-emit-dependencies") and not invocation.output_file_maps:
+        for path in invocation.outputs:
+            write(os.path.splitext(path)[0] + ".d", invocation.dependency_data(path))
+
+    if invocation.has("-debug-time-function-bodies"):
+        print_timings(invocation)
+    for i, arg in enumerate(args[:-1]):
+        if arg == "-stats-output-dir":
+            os.makedirs(args[i + 1], exist_ok=True)
+            write(
+                os.path.join(args[i + 1], f"stats-{os.getpid()}.json"),
+                json.dumps({"Frontend.NumSourceFiles": len(invocation.sources)}),
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))